@@ -1,4 +1,20 @@
 # coding=utf-8
+import importlib
 from .base import Base
-from .directory import Directory
-from .routeros.address_list import AddressList
+
+# Adapters are imported on first use, so that only the ones in use are loaded.
+_modules = {
+    'Directory': '.directory',
+    'ListFile': '.list_file',
+    'AddressList': '.routeros.address_list',
+}
+
+
+def __getattr__(name: str):
+    try:
+        module = _modules[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
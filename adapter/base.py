@@ -5,6 +5,7 @@ __all__ = (
     'Base',
     'ThreadedBase',
     'Error',
+    'digest',
 )
 
 
@@ -12,15 +13,77 @@ class Error(Exception):
     pass
 
 
+def digest(items) -> int:
+    """
+    Digest of the (key, value) pairs in 'items', independent of their order.
+    Only comparable within one process.
+    """
+    return hash(frozenset(items))
+
+
 class Base:
     """
     Adapters should behave like dict.
     After a set of updates, flush() must be called.
-    One key cannot be updated twice, without a call to flush() in between.
+    A key may be updated again before the previous update is flushed;
+    flush(wait=False) applies the updates without waiting for them to complete.
     """
 
-    def flush(self):
-        pass
+    observers = ()
+
+    def observe(self, callback) -> None:
+        """
+        Call 'callback(key, value)' after 'key' changes, with 'value' None if it was removed,
+        and 'callback(None, None)' after the whole map is reloaded.
+        Callbacks may run with the adapter's locks held, so they must be quick.
+        """
+        self.observers = self.observers + (callback,)
+
+    def notify(self, key, value) -> None:
+        for callback in self.observers:
+            callback(key, value)
+
+    def flush(self, wait: bool=True, timeout: float=None) -> bool:
+        """
+        Return False if the updates made since the last flush() were not all applied
+        within 'timeout' seconds, or if some of them were discarded.
+        """
+        return True
+
+    def wait_ready(self, timeout: float=None) -> bool:
+        """
+        Wait until the initial contents have been loaded.
+        Return False if 'timeout' expired first.
+        """
+        return True
+
+    def failures(self) -> dict:
+        """
+        Return {key: (value, error message)} for the updates that could not be applied,
+        with 'value' None for removals.
+        """
+        return {}
+
+    def audit_buckets(self) -> list:
+        """
+        Return the buckets the key space is split into for audit().
+        """
+        return []
+
+    def audit(self, bucket) -> bool:
+        """
+        Compare 'bucket' with its source of truth, and reconcile it if they differ,
+        or have watch() reconcile it. Return True if they differed.
+        """
+        return False
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of the current contents as a plain dict.
+        """
+        if isinstance(self, dict) and type(self).__getitem__ is dict.__getitem__:
+            return dict.copy(self)
+        return {key: self[key] for key in self}
 
     def __enter__(self):
         pass
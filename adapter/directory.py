@@ -5,7 +5,8 @@ import re
 import logging
 import stat
 import time
-from adapter.base import Base, Error
+import zlib
+from adapter.base import Base, Error, digest
 
 __all__ = (
     'Directory',
@@ -20,16 +21,56 @@ class FileNotSymlinkError(Error):
     pass
 
 
+def prefix_shard(width: int=1):
+    """
+    Shard keys by their first 'width' octets (IPv4) or groups (IPv6).
+    Empty groups, as in '::1', are named '_'.
+    """
+    def shard(key: str) -> str:
+        return '.'.join(part or '_' for part in key.replace(':', '.').split('.')[:width])
+    return shard
+
+
+def hash_shard(width: int=256):
+    """
+    Shard keys into 'width' subdirectories by a hash of the key.
+    """
+    def shard(key: str) -> str:
+        return '%x' % (zlib.crc32(key.encode()) % width)
+    return shard
+
+
+SHARDS = {
+    'prefix': prefix_shard,
+    'hash': hash_shard,
+}
+
+
 class Directory(Base, dict):
     """
     Access to directory.
+
+    Keys are symlinks in 'path' or, when 'shard' is set,
+    in subdirectories of 'path' named by the 'prefix' or 'hash' of the key.
+    The modification time of each directory is tracked,
+    so that only the directories that changed are read again.
     """
 
-    def __init__(self, path: str, pattern: str=None):
+    def __init__(self, path: str, pattern: str=None, shard: str=None, shard_width: int=None):
         self.path = path
-        self.mtime = os.path.getmtime(self.path)
         self.pattern = re.compile(pattern or r'.+_test$')
+        if shard is None:
+            self.shard = None
+        elif shard_width is None:
+            self.shard = SHARDS[shard]()
+        else:
+            self.shard = SHARDS[shard](shard_width)
+        self.mtime = None
+        self.mtimes = {self.path: None} if shard is None else {}  # directory: mtime
+        self.shards = {}  # directory: set of keys
+        self.stale = set()  # directories audit() found out of sync, refetched by watch()
         super().__init__()
+        self.changed()
         self.fetch()
 
     def __repr__(self):
@@ -38,46 +79,134 @@ class Directory(Base, dict):
     def __str__(self):
         return 'directory map (path=%r, re=%r)' % (self.path, self.pattern.pattern)
 
-    def changed(self):
-        cur = os.path.getmtime(self.path)
-        if cur != self.mtime:
-            self.mtime = cur
-            return True
-        return False
+    def directories(self) -> set:
+        if self.shard is None:
+            return {self.path}
+        with os.scandir(self.path) as it:
+            return {entry.path for entry in it if entry.is_dir(follow_symlinks=False)}
+
+    def directory(self, key: str) -> str:
+        if self.shard is None:
+            return self.path
+        return os.path.join(self.path, self.shard(key))
+
+    def changed(self) -> set:
+        """
+        Return the directories that changed since the last call.
+        """
+        if self.shard is not None:
+            # Look for new shards only when 'path' itself changed.
+            cur = os.path.getmtime(self.path)
+            if cur != self.mtime:
+                self.mtime = cur
+                for directory in self.directories() - self.mtimes.keys():
+                    self.mtimes[directory] = None
+        changed = set()
+        for directory, mtime in list(self.mtimes.items()):
+            try:
+                cur = os.path.getmtime(directory)
+            except FileNotFoundError:
+                if self.shard is None:
+                    raise
+                cur = None
+            if cur != mtime:
+                changed.add(directory)
+                if cur is None:
+                    del self.mtimes[directory]  # refetched as empty.
+                else:
+                    self.mtimes[directory] = cur
+        return changed
 
     def watch(self):
         while True:
             time.sleep(1)
-            if self.changed():
-                self.fetch()
+            changed = self.changed()
+            while self.stale:
+                changed.add(self.stale.pop())
+            if changed:
+                self.fetch(changed)
                 return True
 
-    def fetch(self):
-        self.clear()
-        for key in os.listdir(self.path):
-            file = os.path.join(self.path, key)
+    def fetch(self, directories=None):
+        """
+        Read all 'directories', or every directory if None.
+        """
+        if directories is None:
+            # Also the known ones, in case they are gone.
+            directories = self.directories() | self.shards.keys()
+        for directory in directories:
+            self.fetch_directory(directory)
+
+    def fetch_directory(self, directory: str, entries: dict=None):
+        old = {}
+        for key in self.shards.pop(directory, ()):
+            with contextlib.suppress(KeyError):
+                old[key] = dict.pop(self, key)
+        if entries is None:
+            entries = self.read_directory(directory)
+        self.shards[directory] = set(entries)
+        dict.update(self, entries)
+        if self.observers:
+            for key in old.keys() - entries.keys():
+                self.notify(key, None)
+            for key, value in entries.items():
+                if old.get(key) != value:
+                    self.notify(key, value)
+
+    def read_directory(self, directory: str) -> dict:
+        entries = {}
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return entries
+        for key in names:
+            file = os.path.join(directory, key)
             try:
                 value = os.readlink(file)
             except (FileNotFoundError, OSError):
                 pass  # file was deleted or was not a symlink.
             else:
                 if self.pattern.match(value):
-                    super().__setitem__(key, value)
+                    entries[key] = value
+        return entries
+
+    def audit_buckets(self) -> list:
+        return sorted(self.directories())
+
+    def audit(self, directory: str) -> bool:
+        """
+        Runs on the audit thread, so it only reads;
+        a directory out of sync is refetched by watch(), like one that changed.
+        """
+        local = digest((key, self.get(key)) for key in tuple(self.shards.get(directory, ())))
+        entries = self.read_directory(directory)
+        if digest(entries.items()) == local:
+            return False
+        self.stale.add(directory)
+        return True
 
     def __setitem__(self, key: str, value: str):
-        file = os.path.join(self.path, key)
+        directory = self.directory(key)
+        file = os.path.join(directory, key)
         while True:
             try:
                 os.symlink(value, file)
             except FileExistsError:
                 with contextlib.suppress(KeyError):
                     del self[key]
+            except FileNotFoundError:
+                if directory == self.path:
+                    raise
+                os.makedirs(directory, exist_ok=True)
             else:
                 super().__setitem__(key, value)
+                self.shards.setdefault(directory, set()).add(key)
+                self.notify(key, value)
                 return
 
     def __delitem__(self, key: str):
-        file = os.path.join(self.path, key)
+        directory = self.directory(key)
+        file = os.path.join(directory, key)
         try:
             x = os.lstat(file)
             if stat.S_ISLNK(x.st_mode):
@@ -88,3 +217,5 @@ class Directory(Base, dict):
                 raise FileNotSymlinkError(file)
         except FileNotFoundError:
             super().__delitem__(key)
+        self.shards.get(directory, set()).discard(key)
+        self.notify(key, None)
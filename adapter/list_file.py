@@ -0,0 +1,252 @@
+# coding=utf-8
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import time
+import zlib
+from adapter.base import Base, Error
+
+__all__ = (
+    'ListFile',
+    'Error',
+)
+
+log = logging.getLogger(__name__)
+
+
+def split_blocks(buf, size: int, block_lines: int, block_size: int):
+    """
+    Yield (start, end) offsets of blocks of about 'block_lines' lines.
+    A block ends after a line whose CRC is a multiple of 'block_lines',
+    so inserting or removing a line only changes the block it is in.
+    Blocks longer than 'block_size' bytes are cut at the next line.
+    """
+    start = pos = 0
+    while pos < size:
+        end = buf.find(b'\n', pos)
+        end = size if end < 0 else end + 1
+        if zlib.crc32(buf[pos:end]) % block_lines == 0 or end - start >= block_size or end == size:
+            yield start, end
+            start = end
+        pos = end
+
+
+def decode_lines(data: bytes):
+    """
+    Yield the lines of 'data', decoded as UTF-8.
+    Lines that are not valid UTF-8 are logged and skipped.
+    """
+    try:
+        yield from data.decode().splitlines()
+        return
+    except UnicodeDecodeError:
+        pass
+    for line in data.splitlines():
+        try:
+            yield line.decode()
+        except UnicodeDecodeError:
+            log.warning("Ignoring line that is not UTF-8: %r", line)
+
+
+def parse_lines(data: bytes):
+    """
+    Yield (address, list_name) for every line of 'data'.
+    Empty lines and lines starting with '#' are ignored.
+    """
+    for line in decode_lines(data):
+        words = line.split(None, 2)
+        if len(words) >= 2 and not words[0].startswith('#'):
+            yield words[0], words[1]
+
+
+def copy_mode(fd: int, path: str):
+    """
+    Give 'fd' the mode and owner of 'path', or the default mode of new files
+    if 'path' does not exist; mkstemp() creates files readable only by us.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        return
+    os.fchmod(fd, st.st_mode & 0o7777)
+    own = os.fstat(fd)
+    if (own.st_uid, own.st_gid) != (st.st_uid, st.st_gid):
+        try:
+            os.fchown(fd, st.st_uid, st.st_gid)
+        except PermissionError:
+            log.warning("Could not keep the owner of %r.", path)
+
+
+class ListFile(Base, dict):
+    """
+    Access to a plain-text file with one 'address list_name' pair per line.
+
+    The file is read in blocks, cut where the content says so (see split_blocks());
+    each block is remembered by its digest,
+    so that after a small edit only the blocks that changed are parsed again.
+    Changes are kept in memory, and written by flush() in a single pass,
+    replacing the file atomically. The file is UTF-8; lines of lists not matching 'pattern',
+    and lines of keys that did not change, are kept as they are.
+    """
+
+    BLOCK_LINES = 1 << 14
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, path: str, pattern: str=None):
+        self.path = path
+        self.pattern = re.compile(pattern or r'.+_test$')
+        self.stat = None
+        self.blocks = []  # [(digest, {address: list_name}), ...]
+        self.dirty = False
+        super().__init__()
+        self.changed()
+        self.fetch()
+
+    def __repr__(self):
+        return 'ListFile(%r, %r)' % (self.path, self.pattern.pattern)
+
+    def __str__(self):
+        return 'list file map (path=%r, re=%r)' % (self.path, self.pattern.pattern)
+
+    def changed(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            cur = None
+        else:
+            cur = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if cur != self.stat:
+            self.stat = cur
+            return True
+        return False
+
+    def watch(self):
+        while True:
+            time.sleep(1)
+            if self.changed():
+                self.fetch()
+                return True
+
+    def fetch(self):
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    blocks = []
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        blocks = self.read_blocks(m, size)
+        except FileNotFoundError:
+            blocks = []
+        if self.observers:
+            # Only keys in blocks that changed may have changed.
+            old_digests = {digest for digest, _ in self.blocks}
+            new_digests = {digest for digest, _ in blocks}
+            keys = set()
+            for digest, entries in self.blocks:
+                if digest not in new_digests:
+                    keys.update(entries)
+            for digest, entries in blocks:
+                if digest not in old_digests:
+                    keys.update(entries)
+            old = {key: self.get(key) for key in keys}
+        else:
+            old = {}
+        self.blocks = blocks
+        self.clear()
+        for _, entries in blocks:
+            dict.update(self, entries)
+        self.dirty = False
+        for key, value in old.items():
+            new = self.get(key)
+            if new != value:
+                self.notify(key, new)
+
+    def read_blocks(self, buf, size: int) -> list:
+        """
+        Split 'buf' into blocks, reusing the parsed entries
+        of blocks whose digest is already known.
+        """
+        known = dict(self.blocks)
+        blocks = []
+        parsed = 0
+        for start, end in split_blocks(buf, size, self.BLOCK_LINES, self.BLOCK_SIZE):
+            data = buf[start:end]
+            digest = hashlib.sha1(data).digest()
+            try:
+                entries = known[digest]
+            except KeyError:
+                entries = {address: list_name
+                           for address, list_name in parse_lines(data)
+                           if self.pattern.match(list_name)}
+                parsed += 1
+            blocks.append((digest, entries))
+        log.debug("Parsed %d of %d blocks of %r.", parsed, len(blocks), self.path)
+        return blocks
+
+    def flush(self, wait: bool=True, timeout: float=None) -> bool:
+        if not self.dirty:
+            return True
+        directory, name = os.path.split(self.path)
+        fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', dir=directory or '.')
+        try:
+            copy_mode(fd, self.path)
+            with open(fd, 'wb') as out:
+                self.write_lines(out)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.changed()
+        self.fetch()
+        return True
+
+    def write_lines(self, out):
+        """
+        Copy the current file to 'out', replacing the lines of the keys that changed,
+        and then append the keys that are new.
+        """
+        written = set()
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            with f:
+                for line in f:
+                    try:
+                        words = line.decode().split(None, 2)
+                    except UnicodeDecodeError:
+                        words = ()
+                    if len(words) < 2 or words[0].startswith('#') or not self.pattern.match(words[1]):
+                        out.write(line)
+                        continue
+                    address = words[0]
+                    if address in written or address not in self:
+                        continue  # removed, or a duplicate.
+                    written.add(address)
+                    list_name = dict.__getitem__(self, address)
+                    if list_name == words[1]:
+                        out.write(line)
+                    else:
+                        words[1] = list_name
+                        out.write((' '.join(words).rstrip('\n') + '\n').encode())
+        for address, list_name in self.items():
+            if address not in written:
+                out.write(('%s %s\n' % (address, list_name)).encode())
+
+    def __setitem__(self, address: str, list_name: str):
+        super().__setitem__(address, list_name)
+        self.dirty = True
+        self.notify(address, list_name)
+
+    def __delitem__(self, address: str):
+        super().__delitem__(address)
+        self.dirty = True
+        self.notify(address, None)
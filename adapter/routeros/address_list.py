@@ -1,10 +1,12 @@
 # coding=utf-8
 from collections import OrderedDict
+import itertools
 import re
 import logging
 import threading
-import time
-from adapter.base import ThreadedBase, Error
+from adapter.base import ThreadedBase, Error, digest
+from adapter.routeros import reader
+from adapter.routeros import capture
 
 __all__ = (
     'AddressList',
@@ -14,6 +16,19 @@ __all__ = (
 log = logging.getLogger(__name__)
 
 
+# Traps that fail the same way however often they are retried,
+# like duplicate entries or invalid addresses.
+PERMANENT_TRAP = re.compile(r'already have|invalid|no such|bad ', re.IGNORECASE)
+
+
+def is_permanent(trap: dict) -> bool:
+    """
+    Categories 0 and 1 are missing items and invalid arguments;
+    RouterOS sends many other errors without a category.
+    """
+    return trap.get('category') in ('0', '1') or bool(PERMANENT_TRAP.search(trap.get('message', '')))
+
+
 def sentence_to_dict(sentence: list) -> dict:
     attrs = {}
     for word in sentence:
@@ -29,20 +44,39 @@ def sentence_to_dict(sentence: list) -> dict:
 class AddressList(ThreadedBase, OrderedDict):
     """
     Maintains a local copy of /ip firewall address-list.
+    Sentences are read by the reader.Reader shared by all address lists of one client.
+
+    Local changes are applied to the copy at once, and sent to RouterOS in the background.
+    At most one command per address is pending; changes made to an address
+    while its command is pending are coalesced, and sent when it completes.
     """
 
     def __init__(self, routeros=None, pattern: str=None, **kwargs):
         self.by_id = {}
         self.removed_ids = None  # used during /getall
-        self.next_tag = 0
+        self.refetching = False  # set from enter_fetch_mode() until the /getall is done
+        self.discarded = False  # set when a refetch discards changes not yet applied
+        self.tags = itertools.count()
         self.routeros = routeros
         self.pattern = re.compile(pattern or r'.+_test$')
         self.timeout = ['=timeout=%s' % kwargs['timeout']] if 'timeout' in kwargs else []
+        self.retries = kwargs.get('retries', 3)
+        self.retry_delay = kwargs.get('retry_delay', 1)
         self.update_event = threading.Event()
+        self.fetched = threading.Event()  # set once the first /getall is done
         super().__init__()
         self.commands = {}
-        self.commands_update = threading.Condition()
-        threading.Thread(target=self._reader, daemon=True).start()
+        self.commands_update = threading.Condition()  # also guards the local copy
+        self.pending = {}  # address: list name being added or set, or None if being removed
+        self.removing = {}  # address: item removed locally but not yet from RouterOS
+        self.traps = {}  # tag: !trap sentence of a pending command
+        self.retrying = {}  # address: (attempts, timer, token) of a command that failed
+        self.acked = {}  # address: list name RouterOS has, while a set is not acknowledged
+        self.failed = {}  # address: (list name or None, error message) of the last command given up on
+        self.audits = {}  # tag: (list name, rows, event, result)
+        self.audit_lists = set()
+        self.recorder = capture.Recorder(kwargs['capture']) if 'capture' in kwargs else None
+        self.tag_prefix = reader.register(routeros, self) if routeros is not None else ''
 
     def __repr__(self):
         return 'AddressList(%r)' % (self.pattern.pattern,)
@@ -57,118 +91,285 @@ class AddressList(ThreadedBase, OrderedDict):
         log.debug("Reporting update.")
         return True
 
-    def flush(self):
+    def wait_ready(self, timeout: float=None) -> bool:
+        return self.fetched.wait(timeout)
+
+    def failures(self) -> dict:
+        with self.commands_update:
+            return dict(self.failed)
+
+    def flush(self, wait: bool=True, timeout: float=None) -> bool:
+        if self.routeros is not None:
+            self.routeros.flush_writes()
+        if not wait:
+            return True
         log.debug("Waiting for %d commands to complete.", len(self.commands))
         with self.commands_update:
-            while len(self.commands) > 0:
-                self.commands_update.wait()
+            # A refetch discards the commands, and needs the adapter lock flush() is called with.
+            if not self.commands_update.wait_for(
+                    lambda: (len(self.commands) == 0 and len(self.retrying) == 0) or self.refetching,
+                    timeout):
+                log.warning("%d commands still pending after %ss.", len(self.commands), timeout)
+                return False
+            discarded, self.discarded = self.discarded, False
+        if discarded:
+            log.warning("Changes were discarded by a refetch.")
+            return False
         log.debug("All done.")
+        return True
 
     def get_tag(self):
-        tag = '%X' % self.next_tag
-        self.next_tag += 1
-        return tag
-
-    def write_fetch(self) -> None:
-        log.debug("Writing getall command.")
-        with self.routeros as client:
-            cmd = ['/ip/firewall/address-list/getall',
-                   '=.proplist=.id,address,list',
-                   '.tag=FETCH']
-            client._api.write_sentence(cmd)
+        return '%s%X' % (self.tag_prefix, next(self.tags))
 
     def enter_fetch_mode(self):
+        # No commands should be run in fetch mode, or sent until it starts.
+        # If any threads were waiting on flush(), notify them,
+        # so that they release the adapter lock.
+        with self.commands_update:
+            self.refetching = True
+            if self.commands or self.pending or self.retrying:
+                self.discarded = True
+            self.commands.clear()
+            for _, timer, _ in self.retrying.values():
+                if timer is not None:
+                    timer.cancel()
+            self.retrying.clear()
+            self.commands_update.notify_all()
         if self.in_fetch_mode():
             log.debug("Already in fetch mode.")
         else:
             log.debug("Acquiring adapter lock.")
             self.lock.acquire()
-        self.clear()
-        self.by_id.clear()
-        self.removed_ids = set()
-        # No commands should be run in fetch mode.
-        # If any threads were waiting on flush(), notify them.
         with self.commands_update:
             self.commands.clear()
-            self.commands_update.notify_all()
+            self.traps.clear()
+            self.pending.clear()
+            self.removing.clear()
+            self.acked.clear()
+            self.failed.clear()
+            self.clear()
+            self.by_id.clear()
+            self.removed_ids = set()
 
     def in_fetch_mode(self):
         return self.removed_ids is not None
 
     def exit_fetch_mode(self):
         self.removed_ids = None
+        self.refetching = False
+        self.fetched.set()
+        self.notify(None, None)
         self.lock.release()
         log.debug("Adapter lock released.")
         self.update_event.set()
 
-    def write_listen(self) -> None:
-        log.debug("Writing listen command.")
-        with self.routeros as client:
-            cmd = ['/ip/firewall/address-list/listen',
-                   '=.proplist=.id,.dead,address,list',
-                   '.tag=LISTEN']
-            client._api.write_sentence(cmd)
-
-    def write_add(self, address: str, list_name: str) -> str:
+    def write_add(self, tag: str, address: str, list_name: str) -> None:
         log.debug("Writing add command: address=%r list_name=%r", address, list_name)
-        tag = self.get_tag()
-        with self.routeros as client:
-            cmd = ['/ip/firewall/address-list/add',
-                   '.tag=%s' % tag,
-                   '=address=%s' % address,
-                   '=list=%s' % list_name]
-            cmd += self.timeout
-            client._api.write_sentence(cmd)
-        return tag
-
-    def write_set(self, _id_: str, list_name: str) -> str:
+        cmd = ['/ip/firewall/address-list/add',
+               '.tag=%s' % tag,
+               '=address=%s' % address,
+               '=list=%s' % list_name]
+        cmd += self.timeout
+        self.write_sentence(cmd)
+
+    def write_set(self, tag: str, _id_: str, list_name: str) -> None:
         log.debug("Writing set command: id=%r list_name=%r", _id_, list_name)
-        tag = self.get_tag()
-        with self.routeros as client:
-            cmd = ['/ip/firewall/address-list/set',
-                   '.tag=%s' % tag,
-                   '=.id=%s' % _id_,
-                   '=list=%s' % list_name]
-            cmd += self.timeout
-            client._api.write_sentence(cmd)
-        return tag
-
-    def write_remove(self, _id_: str) -> str:
+        cmd = ['/ip/firewall/address-list/set',
+               '.tag=%s' % tag,
+               '=.id=%s' % _id_,
+               '=list=%s' % list_name]
+        cmd += self.timeout
+        self.write_sentence(cmd)
+
+    def write_remove(self, tag: str, _id_: str) -> None:
         log.debug("Writing remove command: _id_=%r", _id_)
+        cmd = ['/ip/firewall/address-list/remove',
+               '.tag=%s' % tag,
+               '=.id=%s' % _id_]
+        self.write_sentence(cmd)
+
+    def write_print(self, tag: str, list_name: str) -> None:
+        log.debug("Writing print command: list_name=%r", list_name)
+        cmd = ['/ip/firewall/address-list/print',
+               '.tag=%s' % tag,
+               '=.proplist=.id,address,list',
+               '?list=%s' % list_name]
+        self.write_sentence(cmd, flush=True)
+
+    def write_sentence(self, cmd: list, flush: bool=False) -> None:
+        """
+        Queue 'cmd' to be sent with other commands; see routeros.Client.
+        """
+        if self.recorder is not None:
+            self.recorder.record('w', cmd)
+        self.routeros.write_sentence(cmd, flush)
+
+    def send(self, address: str) -> None:
+        """
+        Write the command that brings RouterOS closer to the local state of 'address'.
+        Must be called with 'commands_update' held, and no command pending for 'address'.
+        Nothing is sent while a refetch is pending; it replaces the local copy.
+        """
+        if self.refetching:
+            self.discarded = True
+            return
+        removed = self.removing.get(address)
+        try:
+            d = super().__getitem__(address)
+        except KeyError:
+            d = None
         tag = self.get_tag()
-        with self.routeros as client:
-            cmd = ['/ip/firewall/address-list/remove',
-                   '.tag=%s' % tag,
-                   '=.id=%s' % _id_]
-            client._api.write_sentence(cmd)
-        return tag
+        if removed is not None:
+            self.commands[tag] = (self.handle_remove_response, (removed['.id'], address))
+            self.pending[address] = None
+            write = self.write_remove, (tag, removed['.id'])
+        elif d is None:
+            return
+        elif d['.id'] is None:
+            self.commands[tag] = (self.handle_add_response, (address, d['list']))
+            self.pending[address] = d['list']
+            write = self.write_add, (tag, address, d['list'])
+        else:
+            self.commands[tag] = (self.handle_set_response, (address, d['list']))
+            self.pending[address] = d['list']
+            write = self.write_set, (tag, d['.id'], d['list'])
+        try:
+            write[0](*write[1])
+        except Exception:
+            del self.commands[tag]
+            del self.pending[address]
+            raise
+
+    def complete(self, address: str, sent) -> None:
+        """
+        The command pending for 'address' is done.
+        If 'address' changed locally in the meantime, send the next command.
+        """
+        del self.pending[address]
+        self.retrying.pop(address, None)
+        self.failed.pop(address, None)
+        try:
+            d = super().__getitem__(address)
+        except KeyError:
+            d = None
+        if address in self.removing:
+            self.send(address)
+        elif d is not None and (d['.id'] is None or (sent is not None and d['list'] != sent)):
+            self.send(address)
+
+    def handle_trap(self, c: tuple, trap: dict) -> None:
+        """
+        The command 'c' failed with 'trap'.
+        Retry it later, with exponential backoff, or give up after 'retries' attempts,
+        or at once if retrying cannot help.
+        The address stays pending meanwhile, so that new changes are coalesced.
+        """
+        handler, args = c
+        address = args[1] if handler == self.handle_remove_response else args[0]
+        message = trap.get('message', '')
+        if 'no such item' in message and handler != self.handle_add_response:
+            self.handle_missing_item(c)
+            return
+        attempts = self.retrying.pop(address, (0,))[0] + 1
+        if attempts <= self.retries and not is_permanent(trap):
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            log.warning("Command for %r failed (%s); retry %d in %gs.", address, message, attempts, delay)
+            token = object()
+            timer = threading.Timer(delay, self.retry, (address, token))
+            timer.daemon = True
+            self.retrying[address] = (attempts, timer, token)
+            timer.start()
+            return
+        log.error("Command for %r failed (%s); giving up.", address, message)
+        sent = done = self.pending[address]
+        d = self.get_item(address)
+        if handler == self.handle_remove_response:
+            # Still there, as far as we know.
+            removed = self.removing.pop(address, None)
+            if removed is not None and d is None:
+                removed['list'] = self.acked.pop(address, removed['list'])
+                super().__setitem__(address, removed)
+                self.notify(address, removed['list'])
+        elif d is not None and d['list'] == sent:
+            # Not changed locally since; undo the change RouterOS rejected.
+            if d['.id'] is None:
+                super().__delitem__(address)
+                self.notify(address, None)
+            elif address in self.acked:
+                d['list'] = done = self.acked.pop(address)
+                self.notify(address, d['list'])
+        self.complete(address, done)
+        self.failed[address] = (sent, message)
+
+    def handle_missing_item(self, c: tuple) -> None:
+        """
+        A set or remove failed because the item is gone from RouterOS.
+        """
+        handler, args = c
+        if handler == self.handle_remove_response:
+            self.handle_remove_response(args, {})
+            return
+        address = args[0]
+        d = self.get_item(address)
+        log.debug("Item missing from RouterOS: %r", d)
+        if d is not None and d['.id'] is not None:
+            # Forget it, so that it is added again.
+            self.by_id.pop(d['.id'], None)
+            super().__delitem__(address)
+            self.notify(address, None)
+            self.update_event.set()
+        self.acked.pop(address, None)
+        self.complete(address, args[1])
 
-    def read_sentence(self):
-        d = self.routeros.connection._api.read_sentence()
-        self.handle_sentence(sentence_to_dict(d))
+    def retry(self, address: str, token: object) -> None:
+        with self.commands_update:
+            try:
+                attempts, _, current = self.retrying[address]
+            except KeyError:
+                return
+            if current is not token:
+                return  # cancelled by fetch mode.
+            self.retrying[address] = (attempts, None, None)
+            del self.pending[address]
+            try:
+                self.send(address)
+            finally:
+                if address not in self.pending:
+                    # Nothing left to send.
+                    del self.retrying[address]
+                if len(self.commands) == 0 and len(self.retrying) == 0:
+                    self.commands_update.notify_all()
 
     def handle_sentence(self, d: dict):
-        if '!fatal' in d:
-            log.error("Error from RouterOS: %r", d)
-        elif '.tag' in d:
-            if d['.tag'] == 'FETCH':
-                self.handle_fetch_sentence(d)
-            elif d['.tag'] == 'LISTEN':
-                self.handle_listen_sentence(d)
-            elif '!done' in d:
-                try:
-                    with self.commands_update:
+        with self.commands_update:
+            if '!fatal' in d:
+                log.error("Error from RouterOS: %r", d)
+            elif '.tag' in d:
+                if d['.tag'].startswith('FETCH'):
+                    self.handle_fetch_sentence(d)
+                elif d['.tag'] == 'LISTEN':
+                    self.handle_listen_sentence(d)
+                elif d['.tag'] in self.audits:
+                    self.handle_audit_sentence(d)
+                elif '!trap' in d and d['.tag'] in self.commands:
+                    self.traps[d['.tag']] = d
+                elif '!done' in d:
+                    try:
                         c = self.commands.pop(d['.tag'])
-                        if len(self.commands) == 0:
-                            self.commands_update.notify_all()
-                except KeyError:
-                    log.debug("Unknown tag %r", d['.tag'])
+                    except KeyError:
+                        log.debug("Unknown tag %r", d['.tag'])
+                    else:
+                        trap = self.traps.pop(d['.tag'], None)
+                        if trap is None:
+                            c[0](c[1], d)
+                        else:
+                            self.handle_trap(c, trap)
+                    if len(self.commands) == 0 and len(self.retrying) == 0:
+                        self.commands_update.notify_all()
                 else:
-                    c[0](c[1], d)
+                    log.debug("Unknown sentence: %r", d)
             else:
-                log.debug("Unknown sentence: %r", d)
-        else:
-            log.debug("Sentence missing .tag: %r", d)
+                log.debug("Sentence missing .tag: %r", d)
 
     def handle_fetch_sentence(self, d):
         """
@@ -212,6 +413,13 @@ class AddressList(ThreadedBase, OrderedDict):
         """
         {'!re': '', '.id': '*25E', '.tag': 'LISTEN', 'address': '1.2.3.4', 'list': 'list_name_test'}
         """
+        if sentence['address'] in self.pending:
+            return  # the pending command decides; this is likely its echo.
+        if not self.pattern.match(sentence['list']):
+            # The item is not, or is no longer, in one of our lists.
+            if sentence['.id'] in self.by_id:
+                self.handle_remote_removal(sentence)
+            return
         try:
             d = super().__getitem__(sentence['address'])
         except KeyError:
@@ -222,11 +430,13 @@ class AddressList(ThreadedBase, OrderedDict):
             super().__setitem__(d['address'], d)
             self.by_id[_id_] = d
             log.debug("Item remotely added: %r", d)
+            self.notify(d['address'], d['list'])
             self.update_event.set()
         else:
             if d['list'] != sentence['list']:
                 d['list'] = sentence['list']
                 log.debug("Item remotely changed: %r", d)
+                self.notify(d['address'], d['list'])
                 self.update_event.set()
 
     def handle_remote_removal(self, d):
@@ -234,13 +444,19 @@ class AddressList(ThreadedBase, OrderedDict):
         {'!re': '', '.dead': 'true', '.id': '*25E', '.tag': 'LISTEN'}
         """
         try:
-            d = self.by_id[d['.id']]
+            d = self.by_id.pop(d['.id'])
         except KeyError:
-            self.removed_ids.add(d['.id'])
-        else:
-            log.debug("Item remotely removed: %r", dict(self.by_id[d['.id']]))
-            super().__delitem__(d['address'])
-            del self.by_id[d['.id']]
+            if self.in_fetch_mode():
+                self.removed_ids.add(d['.id'])
+            return
+        address = d['address']
+        self.acked.pop(address, None)
+        if self.removing.get(address) is d:
+            del self.removing[address]
+        elif self.get_item(address) is d:
+            log.debug("Item remotely removed: %r", d)
+            super().__delitem__(address)
+            self.notify(address, None)
             self.update_event.set()
 
     def handle_add_response(self, c: tuple, sentence: dict):
@@ -248,23 +464,36 @@ class AddressList(ThreadedBase, OrderedDict):
         c = ('5.6.7.8', 'list_name_test')
         sentence = {'!done': '', '.tag': '5E', 'ret': '*25E'}
         """
+        address, list_name = c
         _id_ = sentence['ret']
-        d = {'.id': _id_,
-             'address': c[0],
-             'list': c[1]}
-        super().__setitem__(d['address'], d)
+        d = self.get_item(address)
+        if d is not None and d['.id'] is None:
+            d['.id'] = _id_
+            if d['list'] != list_name:
+                self.acked[address] = list_name
+        else:
+            # Removed locally while being added.
+            d = {'.id': _id_,
+                 'address': address,
+                 'list': list_name}
+            self.removing[address] = d
         self.by_id[_id_] = d
         log.debug("Item added: %r", d)
+        self.complete(address, list_name)
 
     def handle_set_response(self, c: tuple, sentence: dict):
         """
-        c = ('*25F', 'list_name_test')
+        c = ('1.2.3.4', 'list_name_test')
         sentence = {'!done': '', '.tag': '0'}
         """
-        _id_, list_name = c
-        d = self.by_id[_id_]
-        d['list'] = list_name
-        log.debug("Item changed: %r", d)
+        address, list_name = c
+        log.debug("Item changed: address=%r list_name=%r", address, list_name)
+        d = self.get_item(address)
+        if d is not None and d['list'] != list_name:
+            self.acked[address] = list_name
+        else:
+            self.acked.pop(address, None)
+        self.complete(address, list_name)
 
     def handle_remove_response(self, c: tuple, sentence: dict):
         """
@@ -272,44 +501,135 @@ class AddressList(ThreadedBase, OrderedDict):
         sentence = {'!done': '', '.tag': '0'}
         """
         _id_, address = c
-        log.debug("Item removed: %r", dict(self.by_id[_id_]))
-        super().__delitem__(address)
-        del self.by_id[_id_]
+        d = self.by_id.pop(_id_, None)
+        if d is not None and self.removing.get(address) is d:
+            del self.removing[address]
+            self.acked.pop(address, None)
+        log.debug("Item removed: %r", d)
+        self.complete(address, None)
+
+    def audit_buckets(self) -> list:
+        """
+        Audit one list name at a time; RouterOS can select those with a query.
+        There is no finer selection, so auditing a list downloads all of it.
+        """
+        with self:
+            self.audit_lists.update(d['list'] for d in super().values())
+        return sorted(self.audit_lists)
 
-    def __getitem__(self, address: str):
-        return super().__getitem__(address)['list']
+    def audit(self, list_name: str, timeout: float=60) -> bool:
+        """
+        Read 'list_name' again from RouterOS, and reconcile the local copy if it differs.
+        """
+        event = threading.Event()
+        result = []
+        with self:
+            tag = self.get_tag()
+            self.audits[tag] = (list_name, [], event, result)
+            try:
+                self.write_print(tag, list_name)
+            except Exception:
+                del self.audits[tag]
+                raise
+        if not event.wait(timeout):
+            self.audits.pop(tag, None)
+            log.warning("Timeout auditing %r.", list_name)
+            return False
+        return result[0]
+
+    def handle_audit_sentence(self, d: dict):
+        """
+        While printing:
+        d = {'!re': '', '.id': '*72', '.tag': '5E', 'address': '1.2.3.4', 'list': 'list_name_test'}
 
-    def __setitem__(self, address: str, list_name: str):
-        log.debug('%r %r' % (address, list_name))
-        try:
-            d = super().__getitem__(address)
-        except KeyError:
-            tag = self.write_add(address, list_name)
-            self.commands[tag] = (self.handle_add_response, (address, list_name))
+        When done:
+        d = {'!done': '', '.tag': '5E'}
+        """
+        list_name, rows, event, result = self.audits[d['.tag']]
+        if '!re' in d:
+            rows.append(d)
+            return
+        del self.audits[d['.tag']]
+        if '!done' in d:
+            result.append(self.reconcile(list_name, rows))
         else:
-            tag = self.write_set(d['.id'], list_name)
-            self.commands[tag] = (self.handle_set_response, (d['.id'], list_name))
+            log.error("Error auditing %r: %r", list_name, d)
+            result.append(False)
+        event.set()
 
-    def __delitem__(self, address: str):
-        log.debug('%r' % (address,))
+    def reconcile(self, list_name: str, rows: list) -> bool:
+        """
+        Make the local copy of 'list_name' match 'rows', read from RouterOS.
+        """
+        if self.in_fetch_mode() or self.commands or self.pending or self.retrying:
+            log.debug("Not reconciling %r while fetching or running commands.", list_name)
+            return False
+        # Items not yet added have no ID to compare.
+        local = {d['.id']: d for d in super().values() if d['list'] == list_name and d['.id'] is not None}
+        remote = {d['.id']: d for d in rows}
+        if (digest((_id_, d['address']) for _id_, d in local.items()) ==
+                digest((_id_, d['address']) for _id_, d in remote.items())):
+            return False
+        for _id_ in local.keys() - remote.keys():
+            d = self.by_id.pop(_id_)
+            log.debug("Item missing from RouterOS: %r", d)
+            super().__delitem__(d['address'])
+            self.notify(d['address'], None)
+        for _id_ in remote.keys() - local.keys():
+            self.handle_remote_addition(remote[_id_])
+        self.update_event.set()
+        return True
+
+    def get_item(self, address: str):
+        """
+        Return the local item of 'address', or None.
+        """
         try:
-            d = super().__getitem__(address)
+            return super().__getitem__(address)
         except KeyError:
-            pass
-        else:
-            tag = self.write_remove(d['.id'])
-            self.commands[tag] = (self.handle_remove_response, (d['.id'], address))
+            return None
 
-    def _reader(self) -> None:
-        while True:
-            try:
-                with self.routeros(connect=True):
-                    self.enter_fetch_mode()
-                self.write_listen()
-                self.write_fetch()
-                while True:
-                    self.read_sentence()
-            except Exception:
-                log.exception("Error in RouterOS reading thread.")
-                self.routeros.disconnect()
-                time.sleep(1)
+    def __getitem__(self, address: str):
+        return super().__getitem__(address)['list']
+
+    def items(self):
+        return ((address, d['list']) for address, d in super().items())
+
+    def values(self):
+        return (d['list'] for d in super().values())
+
+    def snapshot(self) -> dict:
+        with self.commands_update:
+            return {address: d['list'] for address, d in super().items()}
+
+    def __setitem__(self, address: str, list_name: str):
+        log.debug('%r %r', address, list_name)
+        with self.commands_update:
+            d = self.get_item(address)
+            if d is None:
+                d = {'.id': None,
+                     'address': address,
+                     'list': list_name}
+                super().__setitem__(address, d)
+            elif d['list'] == list_name:
+                return
+            else:
+                if d['.id'] is not None:
+                    self.acked.setdefault(address, d['list'])
+                d['list'] = list_name
+            self.notify(address, list_name)
+            if address not in self.pending:
+                self.send(address)
+
+    def __delitem__(self, address: str):
+        log.debug('%r', address)
+        with self.commands_update:
+            d = self.get_item(address)
+            if d is None:
+                return
+            super().__delitem__(address)
+            self.notify(address, None)
+            if d['.id'] is not None:
+                self.removing[address] = d
+            if address not in self.pending:
+                self.send(address)
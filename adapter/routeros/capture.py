@@ -0,0 +1,163 @@
+# coding=utf-8
+"""
+Record and replay the sentences exchanged with RouterOS by an AddressList.
+
+A capture file is a gzip-compressed text file with one sentence per line:
+    <timestamp> <r|w> <JSON list of words>
+where 'r' marks sentences read from RouterOS and 'w' marks commands written.
+
+To replay a capture and measure how fast it is handled:
+    python -m adapter.routeros.capture <capture-file> [--realtime] [--pattern RE]
+"""
+from collections import OrderedDict
+import argparse
+import atexit
+import gzip
+import json
+import logging
+import threading
+import time
+from adapter.routeros import address_list
+
+__all__ = (
+    'Recorder',
+    'read',
+    'replay',
+)
+
+log = logging.getLogger(__name__)
+
+
+class Recorder:
+    """
+    Append sentences to a capture file.
+    Sentences are buffered, and every flush is written as a complete gzip member,
+    so the file stays readable up to the last flush if the process is killed.
+    """
+
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'ab')
+        self.lines = []
+        self.lock = threading.Lock()
+        self.flushed = time.monotonic()
+        atexit.register(self.close)
+
+    def record(self, direction: str, words: list) -> None:
+        line = '%.6f %s %s\n' % (time.time(), direction,
+                                 json.dumps(words, separators=(',', ':')))
+        with self.lock:
+            self.lines.append(line)
+            now = time.monotonic()
+            if now - self.flushed >= self.FLUSH_INTERVAL:
+                self.flush()
+                self.flushed = now
+
+    def flush(self) -> None:
+        if self.lines and not self.file.closed:
+            self.file.write(gzip.compress(''.join(self.lines).encode()))
+            self.file.flush()
+            self.lines.clear()
+
+    def close(self) -> None:
+        with self.lock:
+            self.flush()
+            self.file.close()
+
+
+def read(path: str):
+    """
+    Yield (timestamp, direction, words) for every sentence in a capture file.
+    A truncated last member, left by a process that was killed, is ignored.
+    """
+    with gzip.open(path, 'rt') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                timestamp, direction, words = line.split(' ', 2)
+                yield float(timestamp), direction, json.loads(words)
+        except EOFError:
+            log.warning("Capture %r is truncated; ignoring its end.", path)
+
+
+def replay_command(subject, words: list) -> None:
+    """
+    Apply a recorded command to 'subject' as if it had been written by it,
+    so that the recorded response is handled as it was originally.
+    """
+    d = address_list.sentence_to_dict(words)
+    command = words[0]
+    if command.endswith('/getall'):
+        subject.enter_fetch_mode()
+        return
+    tag = d.get('.tag')
+    if command.endswith('/add'):
+        address = d['address']
+        item = {'.id': None, 'address': address, 'list': d['list']}
+        OrderedDict.__setitem__(subject, address, item)
+        subject.pending[address] = d['list']
+        subject.commands[tag] = (subject.handle_add_response, (address, d['list']))
+        return
+    try:
+        item = subject.by_id[d['.id']]
+    except KeyError:
+        log.debug("Command for unknown ID: %r", d)
+        return
+    address = item['address']
+    if command.endswith('/set'):
+        item['list'] = d['list']
+        subject.pending[address] = d['list']
+        subject.commands[tag] = (subject.handle_set_response, (address, d['list']))
+    elif command.endswith('/remove'):
+        if subject.get_item(address) is item:
+            OrderedDict.__delitem__(subject, address)
+        subject.removing[address] = item
+        subject.pending[address] = None
+        subject.commands[tag] = (subject.handle_remove_response, (d['.id'], address))
+
+
+def replay(path: str, subject, realtime: bool=False) -> int:
+    """
+    Feed the sentences of a capture file to 'subject', an AddressList.
+    With 'realtime', keep the recorded pace; otherwise, go as fast as possible.
+    Return the number of sentences read from RouterOS that were replayed.
+    """
+    count = 0
+    first = None
+    start = time.monotonic()
+    for timestamp, direction, words in read(path):
+        if realtime:
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+        if direction == 'w':
+            replay_command(subject, words)
+        else:
+            subject.handle_sentence(address_list.sentence_to_dict(words))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a RouterOS capture file.")
+    parser.add_argument('path')
+    parser.add_argument('--realtime', action='store_true',
+                        help="keep the recorded pace")
+    parser.add_argument('--pattern',
+                        help="address-list names to mirror")
+    args = parser.parse_args()
+    subject = address_list.AddressList(pattern=args.pattern)
+    start = time.perf_counter()
+    count = replay(args.path, subject, args.realtime)
+    elapsed = time.perf_counter() - start
+    print("Replayed %d sentences in %.3fs (%.0f/s); %d items in the map."
+          % (count, elapsed, count / elapsed if elapsed else 0, len(subject)))
+
+
+if __name__ == '__main__':
+    main()
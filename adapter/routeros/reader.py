@@ -0,0 +1,169 @@
+# coding=utf-8
+import logging
+import threading
+import time
+from adapter.routeros import address_list
+
+__all__ = (
+    'Reader',
+    'register',
+)
+
+log = logging.getLogger(__name__)
+
+_readers = {}  # routeros.Client: Reader
+_readers_lock = threading.Lock()
+
+
+def register(routeros, subject) -> str:
+    """
+    Register 'subject' with the reader of 'routeros', starting it if needed.
+    Return the prefix 'subject' must use for its command tags.
+    """
+    with _readers_lock:
+        try:
+            reader = _readers[routeros]
+        except KeyError:
+            reader = _readers[routeros] = Reader(routeros)
+            threading.Thread(target=reader.run, daemon=True).start()
+    return reader.register(subject)
+
+
+class Reader:
+    """
+    Read the sentences of one RouterOS connection,
+    and dispatch them to every AddressList using that connection.
+
+    A single /listen and a single /getall are shared by all address lists.
+    Their sentences go to the address lists whose pattern matches the list name.
+    Command responses go to the address list whose prefix starts the tag.
+    """
+
+    def __init__(self, routeros):
+        self.routeros = routeros
+        self.subjects = {}  # tag prefix: AddressList
+        self.routes = {}  # list name: [tag prefix]
+        self.fetches = {}  # /getall tag: {tag prefix}
+        self.next_fetch = 0
+        self.connected = False
+        self.lock = threading.Lock()
+        self.routes_lock = threading.Lock()  # guards 'routes' and changes to 'subjects'
+
+    def register(self, subject) -> str:
+        with self.lock:
+            prefix = '%d.' % len(self.subjects)
+            with self.routes_lock:
+                self.subjects[prefix] = subject
+                self.routes.clear()
+            if self.connected:
+                try:
+                    self.write_fetch([prefix])
+                except Exception:
+                    log.exception("Error fetching %s; will fetch on reconnection.", subject)
+        return prefix
+
+    def route(self, list_name: str) -> list:
+        """
+        Return the prefixes of the address lists whose pattern matches 'list_name'.
+        """
+        try:
+            return self.routes[list_name]
+        except KeyError:
+            pass
+        # Not cached while register() adds an address list it would miss.
+        with self.routes_lock:
+            prefixes = [prefix for prefix, subject in self.subjects.items()
+                        if subject.pattern.match(list_name)]
+            self.routes[list_name] = prefixes
+        return prefixes
+
+    def write_sentence(self, cmd: list, prefixes) -> None:
+        for prefix in prefixes:
+            subject = self.subjects[prefix]
+            if subject.recorder is not None:
+                subject.recorder.record('w', cmd)
+        self.routeros.write_sentence(cmd, flush=True)
+
+    def write_listen(self) -> None:
+        log.debug("Writing listen command.")
+        cmd = ['/ip/firewall/address-list/listen',
+               '=.proplist=.id,.dead,address,list',
+               '.tag=LISTEN']
+        self.write_sentence(cmd, self.subjects)
+
+    def write_fetch(self, prefixes: list) -> None:
+        """
+        Put the address lists in fetch mode, and write one getall command for all of them.
+        """
+        tag = 'FETCH.%X' % self.next_fetch
+        self.next_fetch += 1
+        log.debug("Writing getall command %s for %d address lists.", tag, len(prefixes))
+        for prefix in prefixes:
+            self.subjects[prefix].enter_fetch_mode()
+        self.fetches[tag] = set(prefixes)
+        cmd = ['/ip/firewall/address-list/getall',
+               '=.proplist=.id,address,list',
+               '.tag=%s' % tag]
+        self.write_sentence(cmd, prefixes)
+
+    def read_sentence(self) -> None:
+        words = self.routeros.connection._api.read_sentence()
+        self.dispatch(words)
+
+    def dispatch(self, words: list) -> None:
+        d = address_list.sentence_to_dict(words)
+        tag = d.get('.tag')
+        if tag is None:
+            prefixes = ()
+            log.debug("Sentence missing .tag: %r", d)
+        elif tag == 'LISTEN':
+            if 'list' in d:
+                prefixes = self.route(d['list'])
+                # Also tell the lists holding the item, in case it moved out of them.
+                prefixes = prefixes + [prefix for prefix, subject in list(self.subjects.items())
+                                       if d.get('.id') in subject.by_id and prefix not in prefixes]
+            else:
+                prefixes = list(self.subjects)
+        elif tag in self.fetches:
+            if '!done' in d:
+                prefixes = self.fetches.pop(tag)
+            elif 'list' in d:
+                prefixes = [prefix for prefix in self.route(d['list'])
+                            if prefix in self.fetches[tag]]
+            else:
+                prefixes = self.fetches[tag]
+        else:
+            prefix = tag[:tag.find('.') + 1]
+            if prefix in self.subjects:
+                prefixes = (prefix,)
+            else:
+                prefixes = ()
+                log.debug("Unknown tag %r", tag)
+        for i, prefix in enumerate(prefixes):
+            subject = self.subjects[prefix]
+            if subject.recorder is not None:
+                subject.recorder.record('r', words)
+            # The address lists keep the dict, so each needs its own.
+            try:
+                subject.handle_sentence(d if i == 0 else dict(d))
+            except Exception:
+                # One bad sentence must not tear down the connection of every address list.
+                log.exception("Error handling %r in %s.", words, subject)
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.routeros(connect=True)
+                with self.lock:
+                    self.fetches.clear()
+                    self.write_listen()
+                    self.write_fetch(list(self.subjects))
+                    self.connected = True
+                while True:
+                    self.read_sentence()
+            except Exception:
+                log.exception("Error in RouterOS reading thread.")
+                with self.lock:
+                    self.connected = False
+                self.routeros.disconnect()
+                time.sleep(1)
@@ -0,0 +1,39 @@
+# coding=utf-8
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Auditor:
+    """
+    Continuously audit the buckets of a map, one bucket every 'interval' seconds,
+    so that changes missed by the map are caught without refetching everything.
+    """
+
+    def __init__(self, obj, interval: float):
+        self.obj = obj
+        self.interval = interval
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            buckets = self.obj.audit_buckets()
+            if not buckets:
+                time.sleep(self.interval)
+            for bucket in buckets:
+                time.sleep(self.interval)
+                self.audit(bucket)
+
+    def audit(self, bucket) -> bool:
+        try:
+            drift = self.obj.audit(bucket)
+        except Exception:
+            log.exception("Error auditing %s bucket %r", self.obj, bucket)
+            return False
+        if drift:
+            log.warning("%s bucket %r was out of sync; reconciling.", self.obj, bucket)
+        return drift
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+Benchmark the algorithms of diff.py on two maps of 1M keys (by default),
+first equal and then differing by 1%:
+    python bench_diff.py [--keys N]
+"""
+import argparse
+import time
+import diff
+
+
+def diff_loop(source: dict, dest: dict):
+    """
+    The per-key loop diff_dicts() replaced, as a baseline.
+    """
+    for key, value in source.items():
+        if key not in dest:
+            yield diff.ADD, key, value
+        elif dest[key] != value:
+            yield diff.UPDATE, key, value
+    for key in tuple(dest.keys()):
+        if key not in source:
+            yield diff.REMOVE, key, dest[key]
+
+
+def main():
+    """
+    Benchmark the diff algorithms on two maps of 'keys' keys,
+    first equal and then differing by 1%.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark map diffs.")
+    parser.add_argument('--keys', type=int, default=1000000)
+    args = parser.parse_args()
+    n = args.keys
+    source = {'10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255): 'a_test' for i in range(n)}
+    dest = dict(source)
+    benchmark(source, dest)
+    for i, key in enumerate(list(source)[::100]):
+        if i % 3 == 0:
+            del dest[key]
+        elif i % 3 == 1:
+            dest[key] = 'b_test'
+        else:
+            del source[key]
+    benchmark(source, dest)
+
+
+def benchmark(source: dict, dest: dict):
+    source_sorted = sorted(source.items())
+    dest_sorted = sorted(dest.items())
+    for name, run in (('loop', lambda: diff_loop(source, dest)),
+                      ('dicts', lambda: diff.diff_dicts(source, dest)),
+                      ('sorted', lambda: diff.diff_sorted(source_sorted, dest_sorted))):
+        start = time.perf_counter()
+        count = sum(1 for _ in run())
+        elapsed = time.perf_counter() - start
+        print("%-6s %d changes in %.3fs" % (name, count, elapsed))
+
+
+if __name__ == '__main__':
+    main()
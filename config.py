@@ -1,14 +1,18 @@
 # coding=utf-8
 import sys
+import atexit
 import functools
 import logging
 import logging.config
 import logging.handlers
+import queue
+import threading
 import yaml
 import adapter
-import routeros
 
 log = logging.getLogger(__name__)
+# The C loader, when libyaml is available, is much faster.
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 config = {
     'map': {},
 }
@@ -40,12 +44,45 @@ DEFAULT_FILE_LOGGING_CONFIGURATION = """
 """
 
 
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most 'rate' DEBUG records per second from each logger.
+    Records of other levels are never dropped.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.buckets = {}  # logger name: [tokens, time, dropped]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        with self.lock:
+            try:
+                bucket = self.buckets[record.name]
+            except KeyError:
+                bucket = self.buckets[record.name] = [self.rate, record.created, 0]
+            tokens = min(self.rate, bucket[0] + (record.created - bucket[1]) * self.rate)
+            bucket[1] = record.created
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False
+            bucket[0] = tokens - 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = '(%d messages dropped) %s' % (dropped, record.msg)
+        return True
+
+
 def read() -> None:
     """
     Read configuration into global variable 'config'.
     """
     with open('disy.yml') as f:
-        y = yaml.load(f) or {}
+        y = yaml.load(f, Loader=Loader) or {}
         config.update(y.items())
 
 
@@ -57,48 +94,83 @@ def setup_logging() -> None:
         d = config['log']
     except KeyError:
         # Load default logging configuration.
-        d = yaml.load(DEFAULT_LOGGING_CONFIGURATION)
+        d = yaml.load(DEFAULT_LOGGING_CONFIGURATION, Loader=Loader)
         # Log to stderr if it's a TTY.
         if sys.stderr.isatty():
             d['root']['handlers'].append('console')
         # Log to file if 'log_file' is set.
         if 'log_file' in config:
             s = DEFAULT_FILE_LOGGING_CONFIGURATION.format(**config)
-            y = yaml.load(s)
+            y = yaml.load(s, Loader=Loader)
             d['handlers'].update(y)
             d['root']['handlers'].extend(y.keys())
+        # Do not create records that no handler would emit.
+        d['root']['level'] = min(logging.getLevelName(d['handlers'][name]['level'])
+                                 for name in d['root']['handlers'])
     # Default options.
     d.setdefault('version', 1)
     d.setdefault('disable_existing_loggers', False)
     logging.handlers.SysLogHandler.ident = 'disy: '
     # Let 'logging' configure itself.
     logging.config.dictConfig(d)
+    root = logging.getLogger()
+    # Move the handlers to a background thread.
+    if config.get('log_queue', True):
+        q = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(q, *root.handlers, respect_handler_level=True)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        # Records are formatted here, before their arguments can change;
+        # the level and RateLimitFilter spare formatting the records that are dropped.
+        root.addHandler(logging.handlers.QueueHandler(q))
+        listener.start()
+        atexit.register(listener.stop)
+    # Limit the rate of debug messages.
+    rate = config.get('log_debug_rate', 100)
+    if rate:
+        for handler in root.handlers:
+            handler.addFilter(RateLimitFilter(rate))
 
 
 @functools.lru_cache(maxsize=None)
-def build_routeros(name: str) -> routeros.Client:
+def build_routeros(name: str) -> 'routeros.Client':
+    import routeros
     try:
         d = config['routeros'][name]
         args = ((d['address'], d.get('port', 8728)),
                 d['username'], d['password'])
+        kwargs = {k: d[k] for k in ('cork_size', 'cork_delay') if k in d}
     except KeyError as err:
         log.critical("Missing configuration for RouterOS %s: %s", name, err)
         sys.exit(2)
-    return routeros.Client(*args)
+    return routeros.Client(*args, **kwargs)
 
 
-def build_directory_dict(name: str) -> adapter.Directory:
+def build_directory_dict(name: str) -> 'adapter.Directory':
     try:
         d = config['map'][name]
         args = (d['path'],
-                d.get('pattern', None))
+                d.get('pattern', None),
+                d.get('shard', None),
+                d.get('shard_width', None))
     except KeyError as err:
         log.fatal("Missing configuration for directory %s: %s", name, err)
         sys.exit(2)
     return adapter.Directory(*args)
 
 
-def build_address_list_dict(name: str) -> adapter.AddressList:
+def build_list_file_dict(name: str) -> 'adapter.ListFile':
+    try:
+        d = config['map'][name]
+        args = (d['path'],
+                d.get('pattern', None))
+    except KeyError as err:
+        log.fatal("Missing configuration for list file %s: %s", name, err)
+        sys.exit(2)
+    return adapter.ListFile(*args)
+
+
+def build_address_list_dict(name: str) -> 'adapter.AddressList':
     try:
         d = config['map'][name]
         args = (build_routeros(d['routeros']),)
@@ -110,6 +182,15 @@ def build_address_list_dict(name: str) -> adapter.AddressList:
     return adapter.AddressList(*args, **kwargs)
 
 
+# Map type: builder. Each builder imports only the modules it needs.
+BUILDERS = {
+    'directory': build_directory_dict,
+    'list_file': build_list_file_dict,
+    'address_list': build_address_list_dict,
+}
+
+
+@functools.lru_cache(maxsize=None)
 def build_dict(name: str):
     try:
         dict_type = config['map'][name]['type']
@@ -117,16 +198,28 @@ def build_dict(name: str):
         log.fatal("Missing type option for map %s", name)
         sys.exit(2)
     try:
-        builder = globals()['build_' + dict_type + '_dict']
+        builder = BUILDERS[dict_type]
     except KeyError:
         log.error('Unknown dictionary type: %s', dict_type)
         sys.exit(2)
-    return builder(name)
+    obj = builder(name)
+    interval = config['map'][name].get('audit_interval')
+    if interval:
+        import audit
+        audit.Auditor(obj, interval).start()
+    return obj
 
 
-def source_dict():
-    return build_dict(sys.argv[1])
-
-
-def dest_dict():
-    return build_dict(sys.argv[2])
+def build_lookup() -> 'lookup.Server':
+    import lookup
+    try:
+        d = config['lookup']
+        path = d['socket']
+        names = d['maps']
+    except KeyError as err:
+        log.fatal("Missing configuration for lookup: %s", err)
+        sys.exit(2)
+    index = lookup.Index()
+    for name in names:
+        index.add_map(name, build_dict(name))
+    return lookup.Server(path, index)
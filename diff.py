@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+Compute the changes that make one map equal to another.
+
+Maps are compared as dicts, with comparisons and set operations
+that run in C instead of one Python comparison per key.
+Sequences of items already sorted by key can be merged as two streams instead,
+without holding more than one item of each.
+"""
+import itertools
+import operator
+
+# Kinds of change, in the order they are applied.
+ADD, UPDATE, REMOVE = range(3)
+
+_END = object()
+
+
+def as_dict(obj) -> dict:
+    """
+    Return 'obj' itself if it is a dict holding its own values, or else a snapshot of it.
+    """
+    cls = type(obj)
+    if isinstance(obj, dict) and cls.__getitem__ is dict.__getitem__ and cls.items is dict.items:
+        return obj
+    return obj.snapshot()
+
+
+def diff_dicts(source: dict, dest: dict):
+    """
+    Yield (kind, key, value) for every change that makes 'dest' equal to 'source'.
+    For removals, 'value' is the value in 'dest'.
+    """
+    if source == dest:
+        return
+    current = map(dest.get, source.keys(), itertools.repeat(_END))
+    for key, value in itertools.compress(source.items(), map(operator.ne, current, source.values())):
+        yield (UPDATE if key in dest else ADD), key, value
+    for key in dest.keys() - source.keys():
+        yield REMOVE, key, dest[key]
+
+
+def diff_sorted(source, dest):
+    """
+    Like diff_dicts(), but merge two iterables of (key, value) sorted by key.
+    Only one item of each is held at a time.
+    """
+    source, dest = iter(source), iter(dest)
+    s = next(source, _END)
+    d = next(dest, _END)
+    while s is not _END and d is not _END:
+        if s[0] == d[0]:
+            if s[1] != d[1]:
+                yield UPDATE, s[0], s[1]
+            s = next(source, _END)
+            d = next(dest, _END)
+        elif s[0] < d[0]:
+            yield ADD, s[0], s[1]
+            s = next(source, _END)
+        else:
+            yield REMOVE, d[0], d[1]
+            d = next(dest, _END)
+    while s is not _END:
+        yield ADD, s[0], s[1]
+        s = next(source, _END)
+    while d is not _END:
+        yield REMOVE, d[0], d[1]
+        d = next(dest, _END)
@@ -1,13 +1,52 @@
 # coding=utf-8
+import argparse
 import logging
+import sys
 import config
 import sync
 
 log = logging.getLogger(__name__)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dictionary Synchronizer")
+    parser.add_argument('source', help="map to copy from")
+    parser.add_argument('dest', help="map to copy to")
+    parser.add_argument('--once', action='store_true',
+                        help="synchronize a single time and exit")
+    parser.add_argument('--timeout', type=float, default=60,
+                        help="with --once, seconds to wait for the maps to load, "
+                             "and then for the changes to be applied")
+    return parser.parse_args()
+
+
+def once(synchronizer: sync.Synchronizer, timeout: float) -> int:
+    """
+    Synchronize a single time, print a summary and return the exit status.
+    """
+    try:
+        added, updated, removed = synchronizer.once(timeout)
+    except Exception as err:
+        log.exception("Error synchronizing")
+        print("error: %s" % err, file=sys.stderr)
+        return 2
+    failures = synchronizer.dest.failures()
+    for key, (_, message) in sorted(failures.items()):
+        print("failed: %s: %s" % (key, message), file=sys.stderr)
+    print("added=%d updated=%d removed=%d failed=%d" % (added, updated, removed, len(failures)))
+    return 1 if failures else 0
+
+
 if __name__ == '__main__':
+    args = parse_args()
     config.read()
     config.setup_logging()
-    sync.Synchronizer(config.source_dict(),
-                      config.dest_dict()).run()
+    synchronizer = sync.Synchronizer(config.build_dict(args.source),
+                                     config.build_dict(args.dest),
+                                     config.config.get('priorities'),
+                                     config.config.get('pipeline', False))
+    if args.once:
+        sys.exit(once(synchronizer, args.timeout))
+    if 'lookup' in config.config:
+        config.build_lookup().start()
+    synchronizer.run()
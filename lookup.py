@@ -0,0 +1,212 @@
+# coding=utf-8
+"""
+Answer which lists contain an address or prefix, from the maps disy keeps in memory.
+
+The keys of the indexed maps (addresses like '1.2.3.4' or prefixes like '10.0.0.0/8')
+are kept in one dict of networks per prefix length, updated as the maps change.
+
+Clients connect to a Unix socket and write lines of space-separated addresses or prefixes.
+For every line, the server writes one line per query, 'query list_name ...',
+listing the lists holding an entry that contains the query, and then an empty line.
+"""
+import functools
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+
+__all__ = (
+    'Prefixes',
+    'Index',
+    'Server',
+)
+
+log = logging.getLogger(__name__)
+
+
+def parse(key: str):
+    """
+    Return the (network, prefix length, address length) of 'key', or None if it is not an address or prefix.
+    """
+    # Parsed with inet_pton; the ipaddress module takes several times longer than the lookup.
+    address, slash, length = key.partition('/')
+    try:
+        packed = socket.inet_pton(socket.AF_INET6 if ':' in address else socket.AF_INET, address)
+    except OSError:
+        return None
+    bits = len(packed) * 8
+    if slash:
+        if not length.isdigit() or int(length) > bits:
+            return None
+        length = int(length)
+    else:
+        length = bits
+    network = int.from_bytes(packed, 'big') >> (bits - length) << (bits - length)
+    return network, length, bits
+
+
+class Prefixes:
+    """
+    The keys of one map, in one dict of networks per prefix length,
+    so that finding the prefixes that contain an address takes one lookup per length in use.
+    """
+
+    def __init__(self):
+        self.tables = {32: {}, 128: {}}  # address length: {prefix length: {network: (key, value)}}
+        self.lengths = {32: [], 128: []}  # address length: sorted prefix lengths in use
+
+    def update(self, key: str, value) -> bool:
+        """
+        Index 'key' with 'value', or remove it if 'value' is None.
+        Return False if 'key' is not an address or prefix.
+        """
+        prefix = parse(key)
+        if prefix is None:
+            return False
+        network, length, bits = prefix
+        table = self.tables[bits]
+        networks = table.get(length)
+        if value is not None:
+            if networks is None:
+                networks = table[length] = {}
+                self.lengths[bits] = sorted(table)
+            networks[network] = (key, value)
+        elif networks is not None:
+            entry = networks.get(network)
+            # Another spelling of the same prefix may have replaced it.
+            if entry is not None and entry[0] == key:
+                del networks[network]
+                if not networks:
+                    del table[length]
+                    self.lengths[bits] = sorted(table)
+        return True
+
+    def containing(self, prefix: tuple) -> list:
+        """
+        Return the values of the keys whose prefix contains 'prefix'.
+        """
+        network, length, bits = prefix
+        table = self.tables[bits]
+        values = []
+        for i in self.lengths[bits]:
+            if i > length:
+                break
+            shift = bits - i
+            entry = table[i].get(network >> shift << shift)
+            if entry is not None:
+                values.append(entry[1])
+        return values
+
+
+class Index:
+    """
+    Index the keys of several maps, by name, to answer which lists contain an address.
+
+    Maps notify each change, which is applied at once.
+    When a map is reloaded as a whole, it is indexed again by the reload thread,
+    so that the adapter notifying it is not held up.
+    """
+
+    def __init__(self):
+        self.maps = {}  # map name: adapter
+        self.prefixes = {}  # map name: Prefixes
+        self.changes = {}  # map name: [(key, value)] notified while it is indexed again
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.reloads = queue.Queue()  # names of the maps to index again
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def add_map(self, name: str, obj) -> None:
+        self.maps[name] = obj
+        self.prefixes[name] = Prefixes()
+        obj.observe(functools.partial(self.update, name))
+        self.reload(name)
+
+    def reload(self, name: str) -> None:
+        """
+        Index the whole map 'name' again.
+        The changes notified meanwhile are applied to the new index before it replaces the old one.
+        """
+        with self.reload_lock:
+            with self.lock:
+                self.changes[name] = []
+            contents = self.maps[name].snapshot()
+            prefixes = Prefixes()
+            skipped = sum(1 for key, value in contents.items() if not prefixes.update(key, value))
+            with self.lock:
+                for key, value in self.changes.pop(name):
+                    prefixes.update(key, value)
+                self.prefixes[name] = prefixes
+        log.debug("Indexed %d keys of %s; %d are not addresses.", len(contents) - skipped, name, skipped)
+
+    def update(self, name: str, key, value) -> None:
+        """
+        Observer of map 'name'.
+        """
+        if key is None:
+            self.reloads.put(name)
+            return
+        with self.lock:
+            changes = self.changes.get(name)
+            if changes is not None:
+                changes.append((key, value))
+            if not self.prefixes[name].update(key, value):
+                log.debug("Not indexing %r of %s: not an address.", key, name)
+
+    def run(self) -> None:
+        while True:
+            name = self.reloads.get()
+            try:
+                self.reload(name)
+            except Exception:
+                log.exception("Error indexing %s", name)
+            finally:
+                self.reloads.task_done()
+
+    def lookup(self, query: str) -> list:
+        """
+        Return the sorted names of the lists holding an entry that contains 'query'.
+        """
+        prefix = parse(query)
+        if prefix is None:
+            raise ValueError("not an address or prefix: %r" % query)
+        values = set()
+        with self.lock:
+            for prefixes in self.prefixes.values():
+                values.update(prefixes.containing(prefix))
+        return sorted(values)
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            out = []
+            for query in line.decode('ascii', 'replace').split():
+                try:
+                    out.append(' '.join([query] + self.server.index.lookup(query)))
+                except ValueError as err:
+                    out.append('%s !error %s' % (query, err))
+            out.append('')
+            self.wfile.write(('\n'.join(out) + '\n').encode())
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve lookups on the Unix socket 'path'.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, index: Index):
+        self.index = index
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        super().__init__(path, Handler)
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
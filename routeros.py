@@ -2,6 +2,7 @@
 from copy import copy
 import logging
 import threading
+import time
 import tikapy
 
 log = logging.getLogger(__name__)
@@ -15,17 +16,60 @@ class NotConnectedError(Error):
     pass
 
 
+def encode_word(word: str) -> bytes:
+    """
+    Encode an API word, prefixed by its length.
+    """
+    data = word.encode('latin-1')
+    length = len(data)
+    if length < 0x80:
+        prefix = length.to_bytes(1, 'big')
+    elif length < 0x4000:
+        prefix = (length | 0x8000).to_bytes(2, 'big')
+    elif length < 0x200000:
+        prefix = (length | 0xC00000).to_bytes(3, 'big')
+    elif length < 0x10000000:
+        prefix = (length | 0xE0000000).to_bytes(4, 'big')
+    elif length < 0x100000000:
+        prefix = b'\xF0' + length.to_bytes(4, 'big')
+    else:
+        raise Error("Word too long: %d bytes" % length)
+    return prefix + data
+
+
+def encode_sentence(words: list) -> bytes:
+    """
+    Encode an API sentence, terminated by a zero-length word.
+    """
+    return b''.join(map(encode_word, words)) + b'\x00'
+
+
 class Client:
     """
     Manage one connection to RouterOS.
+
+    Sentences written with write_sentence() are corked: they are sent together,
+    with a single sendall(), once 'cork_size' bytes are waiting,
+    'cork_delay' seconds after the first of them, or on flush_writes().
+    Only the writer thread sends, so writing never blocks on the socket;
+    the reading thread writes too, and must keep reading for RouterOS to accept more.
     """
 
-    def __init__(self, address, username, password):
+    def __init__(self, address, username, password, cork_size: int=65536, cork_delay: float=0.005):
         self.address = address
         self.username = username
         self.password = password
         self.connection = None
         self.lock = threading.Lock()
+        self.cork_size = cork_size
+        self.cork_delay = cork_delay
+        self.corked = []  # encoded sentences waiting to be sent
+        self.corked_size = 0
+        self.corked_since = None
+        self.corked_connection = None  # the connection they were written for
+        self.flush_requested = False
+        self.cork = threading.Condition()
+        threading.Thread(target=self.run_writer, daemon=True).start()
 
     def __call__(self, **kwargs):
         with self.lock:
@@ -46,6 +90,76 @@ class Client:
         finally:
             self.lock.release()
 
+    def write_sentence(self, words: list, flush: bool=False) -> None:
+        """
+        Queue a sentence to be sent; with 'flush', have it and every queued one sent now.
+        """
+        data = encode_sentence(words)
+        with self.cork:
+            if self.connection is None:
+                raise NotConnectedError()
+            if self.corked and self.corked_connection is not self.connection:
+                log.debug("Discarding %d sentences written before reconnection.", len(self.corked))
+                self.corked.clear()
+                self.corked_size = 0
+            # Wake the writer only when it has something new to do:
+            # start the delay of a new batch, or send the batch now.
+            wake = not self.corked
+            if wake:
+                self.corked_connection = self.connection
+                self.corked_since = time.monotonic()
+            self.corked.append(data)
+            self.corked_size += len(data)
+            if (flush or self.corked_size >= self.cork_size) and not self.flush_requested:
+                self.flush_requested = wake = True
+            if wake:
+                self.cork.notify()
+
+    def flush_writes(self) -> None:
+        """
+        Have the queued sentences sent now.
+        """
+        with self.cork:
+            if self.corked and not self.flush_requested:
+                self.flush_requested = True
+                self.cork.notify()
+
+    def take_writes(self) -> tuple:
+        """
+        Wait until the queued sentences are due, and return
+        (the connection they were written for, their data).
+        """
+        with self.cork:
+            while True:
+                if self.corked:
+                    remaining = self.corked_since + self.cork_delay - time.monotonic()
+                    if self.flush_requested or remaining <= 0:
+                        break
+                    self.cork.wait(remaining)
+                else:
+                    self.cork.wait()
+            data = b''.join(self.corked)
+            connection = self.corked_connection
+            self.corked.clear()
+            self.corked_size = 0
+            self.flush_requested = False
+        return connection, data
+
+    def send_writes(self, connection, data: bytes) -> None:
+        if connection is not self.connection:
+            # Written for a connection that is gone; their tags mean nothing now.
+            log.debug("Discarding %d bytes written before reconnection.", len(data))
+            return
+        with self as connection:
+            connection._api.sock.sendall(data)
+
+    def run_writer(self) -> None:
+        while True:
+            try:
+                self.send_writes(*self.take_writes())
+            except Exception:
+                log.exception("Error sending commands to RouterOS.")
+
     def _connect(self):
         self.connection = tikapy.TikapyClient(*self.address)
         self.connection.login(self.username, self.password)
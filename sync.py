@@ -1,19 +1,58 @@
 # coding=utf-8
+import heapq
+import itertools
 import logging
 import threading
 import time
+import diff
+from diff import REMOVE
 
 log = logging.getLogger(__name__)
 
 
+class ChangeQueue:
+    """
+    Changes to be applied to a map, drained in priority order:
+    new keys first, then list changes, then removals.
+    Within each kind, lists with lower priorities go first;
+    lists missing from 'priorities' have priority 0.
+    Changes with the same priority keep the order they were pushed.
+    """
+
+    def __init__(self, priorities: dict=None):
+        self.priorities = priorities or {}
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, kind: int, key: str, value: str):
+        """
+        For removals, 'value' is the list the key is being removed from.
+        """
+        priority = self.priorities.get(value, 0)
+        heapq.heappush(self.heap, (kind, priority, next(self.counter), key, value))
+
+    def drain(self):
+        """
+        Pop and yield (kind, key, value) until the queue is empty.
+        """
+        while self.heap:
+            kind, _, _, key, value = heapq.heappop(self.heap)
+            yield kind, key, value
+
+
 class Synchronizer:
     """
     Synchronize 'source' with 'dest'.
     """
 
-    def __init__(self, source, dest):
+    def __init__(self, source, dest, priorities: dict=None, pipeline: bool=False):
         self.source = source
         self.dest = dest
+        self.priorities = priorities
+        self.pipeline = pipeline
         self.updated_condition = threading.Condition()
 
     def run(self):
@@ -39,22 +78,49 @@ class Synchronizer:
                     log.exception("Error synchronizing")
                     time.sleep(5)
 
-    def synchronize(self):
+    def synchronize(self, wait: bool=True) -> list:
         """
         Synchronize 'source' with 'dest'.
+        Unless 'wait' is False, wait for 'dest' to apply the changes.
+        Return the number of keys added, updated and removed.
         """
-        with self.source, self.dest:
-            # Add / Update.
-            for key, value in self.source.items():
-                if key not in self.dest or self.dest[key] != value:
-                    self.dest[key] = value
-            # Remove.
-            # Use 'tuple' to copy the keys, so that 'dest' may be modified within the for loop.
-            for key in tuple(self.dest.keys()):
-                if key not in self.source:
+        # Never hold both locks: the reader of an AddressList takes them in any order.
+        with self.source:
+            source = self.source.snapshot()
+        with self.dest:
+            changes = ChangeQueue(self.priorities)
+            for kind, key, value in diff.diff_dicts(source, diff.as_dict(self.dest)):
+                changes.push(kind, key, value)
+            # Do not repeat updates that have already been given up on.
+            failures = self.dest.failures()
+            counts = [0, 0, 0]
+            for kind, key, value in changes.drain():
+                if key in failures and failures[key][0] == (None if kind == REMOVE else value):
+                    log.debug("Skipping %r, which failed: %s", key, failures[key][1])
+                    continue
+                counts[kind] += 1
+                if kind == REMOVE:
                     del self.dest[key]
-            # Wait for all updates to complete.
-            self.dest.flush()
+                else:
+                    self.dest[key] = value
+            # Wait for all updates to complete, unless pipelining.
+            self.dest.flush(wait=wait and not self.pipeline)
+        return counts
+
+    def once(self, timeout: float=None) -> list:
+        """
+        Wait for 'source' and 'dest' to load, synchronize them a single time,
+        and wait for 'dest' to apply every change; each wait is limited to 'timeout' seconds.
+        Return the counts of 'synchronize'.
+        """
+        for obj in (self.source, self.dest):
+            if not obj.wait_ready(timeout):
+                raise TimeoutError("%s not ready after %ss" % (obj, timeout))
+        counts = self.synchronize(wait=False)
+        # Not holding the lock of 'dest', so that a refetch is not held up.
+        if not self.dest.flush(timeout=timeout):
+            raise RuntimeError("%s did not apply every change within %ss" % (self.dest, timeout))
+        return counts
 
     def watch(self):
         """
@@ -0,0 +1,54 @@
+# coding=utf-8
+import logging
+import os
+import subprocess
+import sys
+import unittest
+import config
+
+
+def make_record(name: str, level: int, created: float):
+    record = logging.LogRecord(name, level, __file__, 1, 'message', (), None)
+    record.created = created
+    return record
+
+
+class RateLimit(unittest.TestCase):
+    """
+    Test the debug rate limit filter.
+    """
+
+    def test_debug_rate_limited_per_logger(self):
+        subject = config.RateLimitFilter(2)
+        passed = [subject.filter(make_record('a', logging.DEBUG, 10.0)) for _ in range(3)]
+        self.assertListEqual(passed, [True, True, False])
+        self.assertTrue(subject.filter(make_record('b', logging.DEBUG, 10.0)))
+
+    def test_tokens_refill(self):
+        subject = config.RateLimitFilter(2)
+        for _ in range(3):
+            subject.filter(make_record('a', logging.DEBUG, 10.0))
+        record = make_record('a', logging.DEBUG, 10.5)
+        self.assertTrue(subject.filter(record))
+        self.assertEqual(record.getMessage(), '(1 messages dropped) message')
+
+    def test_other_levels_pass(self):
+        subject = config.RateLimitFilter(1)
+        passed = [subject.filter(make_record('a', logging.WARNING, 10.0)) for _ in range(3)]
+        self.assertListEqual(passed, [True, True, True])
+
+
+class LazyImport(unittest.TestCase):
+    """
+    Test that only the adapters in use are imported.
+    """
+
+    def test_directory_only(self):
+        code = ("import sys, config\n"
+                "config.config['map']['d'] = {'type': 'directory', 'path': '/tmp'}\n"
+                "config.build_dict('d')\n"
+                "assert 'adapter.directory' in sys.modules\n"
+                "assert 'routeros' not in sys.modules, 'routeros'\n"
+                "assert 'adapter.routeros.address_list' not in sys.modules, 'address_list'\n")
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+# coding=utf-8
+import unittest
+import adapter
+import diff
+
+
+class BaseDict(adapter.Base, dict):
+    pass
+
+
+class SnapshotDict(BaseDict):
+    """
+    Stores its values in records, like AddressList.
+    """
+
+    def __getitem__(self, key):
+        return super().__getitem__(key)['list']
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+
+class Diff(unittest.TestCase):
+    """
+    Test the diff engine.
+    """
+
+    SOURCE = {'1.1.1.1': 'a_test', '2.2.2.2': 'b_test', '4.4.4.4': 'a_test'}
+    DEST = {'2.2.2.2': 'a_test', '3.3.3.3': 'b_test', '4.4.4.4': 'a_test'}
+    CHANGES = [
+        (diff.ADD, '1.1.1.1', 'a_test'),
+        (diff.UPDATE, '2.2.2.2', 'b_test'),
+        (diff.REMOVE, '3.3.3.3', 'b_test'),
+    ]
+
+    def test_dicts(self):
+        self.assertListEqual(sorted(diff.diff_dicts(self.SOURCE, self.DEST)), self.CHANGES)
+
+    def test_sorted(self):
+        changes = diff.diff_sorted(sorted(self.SOURCE.items()), sorted(self.DEST.items()))
+        self.assertListEqual(list(changes), sorted(self.CHANGES, key=lambda c: c[1]))
+
+    def test_equal(self):
+        self.assertListEqual(list(diff.diff_dicts(self.SOURCE, dict(self.SOURCE))), [])
+        self.assertListEqual(list(diff.diff_sorted([], [])), [])
+
+    def test_as_dict(self):
+        d = BaseDict(self.SOURCE)
+        self.assertIs(diff.as_dict(d), d)
+        s = SnapshotDict({key: {'list': value} for key, value in self.SOURCE.items()})
+        self.assertDictEqual(diff.as_dict(s), self.SOURCE)
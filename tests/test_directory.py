@@ -2,6 +2,7 @@
 import os
 import shutil
 import unittest
+from unittest import mock
 import adapter
 import adapter.directory
 
@@ -89,3 +90,80 @@ class DirectoryDict(unittest.TestCase):
         self.assertFalse(os.path.lexists(self.TMP + '/0.0.0.0'))
         self.assertIsInstance(ctx.exception, adapter.directory.Error)
         self.assertDictEqual(dict(subject), {'0.1.1.1': 'xxx', '6.2.3.4': 'listname_test'})
+
+
+class ShardedDirectoryDict(unittest.TestCase):
+    """
+    Test directory dict with keys in shard subdirectories.
+    """
+
+    TMP = '/tmp/path'
+
+    def setUp(self):
+        os.mkdir(self.TMP)
+        os.mkdir(self.TMP + '/6')
+        os.symlink('listname_test', self.TMP + '/6/6.2.3.4')
+        os.symlink('unknown_link', self.TMP + '/6/6.9.8.7')
+
+    def tearDown(self):
+        shutil.rmtree(self.TMP)
+
+    def test_fetch(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        self.assertDictEqual(dict(subject), {'6.2.3.4': 'listname_test'})
+
+    def test_add_creates_shard(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        subject['2.2.2.2'] = 'new_test'
+        self.assertEqual(os.readlink(self.TMP + '/2/2.2.2.2'), 'new_test')
+        subject.fetch()
+        self.assertDictEqual(dict(subject), {'2.2.2.2': 'new_test', '6.2.3.4': 'listname_test'})
+
+    def test_remove(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        del subject['6.2.3.4']
+        self.assertFalse(os.path.lexists(self.TMP + '/6/6.2.3.4'))
+        self.assertDictEqual(dict(subject), {})
+
+    def test_add_ipv6_empty_group(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        subject['::ffff:1.2.3.4'] = 'new_test'
+        self.assertEqual(os.readlink(self.TMP + '/_/::ffff:1.2.3.4'), 'new_test')
+        fresh = adapter.Directory(self.TMP, shard='prefix')
+        self.assertEqual(fresh['::ffff:1.2.3.4'], 'new_test')
+
+    def test_hash(self):
+        subject = adapter.Directory(self.TMP, shard='hash', shard_width=16)
+        subject['2.2.2.2'] = 'new_test'
+        directory = subject.directory('2.2.2.2')
+        self.assertEqual(os.path.dirname(directory), self.TMP)
+        self.assertEqual(os.readlink(directory + '/2.2.2.2'), 'new_test')
+
+    def test_changed_only_refetches_shard(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        os.mkdir(self.TMP + '/7')
+        os.symlink('other_test', self.TMP + '/7/7.1.1.1')
+        self.assertSetEqual(subject.changed(), {self.TMP + '/7'})
+        dict.__setitem__(subject, '6.0.0.0', 'stale_test')  # not rescanned
+        subject.fetch(subject.changed() | {self.TMP + '/7'})
+        self.assertDictEqual(dict(subject), {'6.0.0.0': 'stale_test',
+                                             '6.2.3.4': 'listname_test',
+                                             '7.1.1.1': 'other_test'})
+        shutil.rmtree(self.TMP + '/7')
+        changed = subject.changed()
+        self.assertSetEqual(changed, {self.TMP + '/7'})
+        subject.fetch(changed)
+        self.assertNotIn('7.1.1.1', subject)
+
+    def test_audit(self):
+        subject = adapter.Directory(self.TMP, shard='prefix')
+        self.assertListEqual(subject.audit_buckets(), [self.TMP + '/6'])
+        self.assertFalse(subject.audit(self.TMP + '/6'))
+        dict.__setitem__(subject, '6.0.0.0', 'stale_test')
+        subject.shards[self.TMP + '/6'].add('6.0.0.0')
+        self.assertTrue(subject.audit(self.TMP + '/6'))
+        self.assertSetEqual(subject.stale, {self.TMP + '/6'})
+        with mock.patch('time.sleep'):
+            self.assertTrue(subject.watch())
+        self.assertDictEqual(dict(subject), {'6.2.3.4': 'listname_test'})
+        self.assertSetEqual(subject.stale, set())
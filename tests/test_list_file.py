@@ -0,0 +1,146 @@
+# coding=utf-8
+import os
+import shutil
+import unittest
+from unittest import mock
+import adapter
+
+
+class ListFileDict(unittest.TestCase):
+    """
+    Test list file dict.
+    """
+
+    TMP = '/tmp/path'
+    FILE = TMP + '/list.txt'
+
+    def setUp(self):
+        os.mkdir(self.TMP)
+        with open(self.FILE, 'w') as f:
+            f.write('# comment\n'
+                    '6.2.3.4 listname_test\n'
+                    '\n'
+                    '0.9.8.7 unknown_link\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.TMP)
+
+    def read(self):
+        with open(self.FILE) as f:
+            return f.read()
+
+    def test_fetch(self):
+        subject = adapter.ListFile(self.FILE)
+        self.assertDictEqual(dict(subject), {'6.2.3.4': 'listname_test'})
+
+    def test_fetch_pattern(self):
+        subject = adapter.ListFile(self.FILE, pattern=r'.*_link')
+        self.assertDictEqual(dict(subject), {'0.9.8.7': 'unknown_link'})
+
+    def test_fetch_missing_file(self):
+        subject = adapter.ListFile(self.TMP + '/missing.txt')
+        self.assertDictEqual(dict(subject), {})
+
+    def test_add(self):
+        subject = adapter.ListFile(self.FILE)
+        subject['2.2.2.2'] = 'new_test'
+        subject.flush()
+        self.assertDictEqual(dict(subject), {'2.2.2.2': 'new_test', '6.2.3.4': 'listname_test'})
+        self.assertEqual(self.read(), '# comment\n'
+                                      '6.2.3.4 listname_test\n'
+                                      '\n'
+                                      '0.9.8.7 unknown_link\n'
+                                      '2.2.2.2 new_test\n')
+
+    def test_set(self):
+        subject = adapter.ListFile(self.FILE)
+        subject['6.2.3.4'] = 'new_test'
+        subject.flush()
+        self.assertDictEqual(dict(subject), {'6.2.3.4': 'new_test'})
+        self.assertEqual(self.read(), '# comment\n'
+                                      '6.2.3.4 new_test\n'
+                                      '\n'
+                                      '0.9.8.7 unknown_link\n')
+
+    def test_remove(self):
+        subject = adapter.ListFile(self.FILE)
+        del subject['6.2.3.4']
+        subject.flush()
+        self.assertDictEqual(dict(subject), {})
+        self.assertEqual(self.read(), '# comment\n'
+                                      '\n'
+                                      '0.9.8.7 unknown_link\n')
+        self.assertListEqual(os.listdir(self.TMP), ['list.txt'])
+
+    def test_other_lines_kept(self):
+        with open(self.FILE, 'w') as f:
+            f.write('1.1.1.1 a_test  # keep me\n'
+                    '2.2.2.2 other extra\n')
+        subject = adapter.ListFile(self.FILE)
+        subject['2.2.2.2'] = 'd_test'
+        subject.flush()
+        self.assertEqual(self.read(), '1.1.1.1 a_test  # keep me\n'
+                                      '2.2.2.2 other extra\n'
+                                      '2.2.2.2 d_test\n')
+        subject['1.1.1.1'] = 'b_test'
+        subject.flush()
+        self.assertEqual(self.read(), '1.1.1.1 b_test # keep me\n'
+                                      '2.2.2.2 other extra\n'
+                                      '2.2.2.2 d_test\n')
+        self.assertDictEqual(dict(subject), {'1.1.1.1': 'b_test', '2.2.2.2': 'd_test'})
+
+    def test_not_utf8(self):
+        with open(self.FILE, 'wb') as f:
+            f.write(b'1.1.1.1 a_test\n'
+                    b'2.2.2.2 \xff_test\n')
+        subject = adapter.ListFile(self.FILE)
+        self.assertDictEqual(dict(subject), {'1.1.1.1': 'a_test'})
+        subject['3.3.3.3'] = 'c_test'
+        subject.flush()
+        with open(self.FILE, 'rb') as f:
+            self.assertEqual(f.read(), b'1.1.1.1 a_test\n'
+                                       b'2.2.2.2 \xff_test\n'
+                                       b'3.3.3.3 c_test\n')
+
+    def test_remove_missing(self):
+        subject = adapter.ListFile(self.FILE)
+        with self.assertRaises(KeyError):
+            del subject['0.0.0.0']
+        self.assertFalse(subject.dirty)
+
+    def test_changed(self):
+        subject = adapter.ListFile(self.FILE)
+        self.assertFalse(subject.changed())
+        with open(self.FILE, 'a') as f:
+            f.write('1.1.1.1 other_test\n')
+        self.assertTrue(subject.changed())
+        subject.fetch()
+        self.assertDictEqual(dict(subject), {'1.1.1.1': 'other_test', '6.2.3.4': 'listname_test'})
+
+    def test_flush_keeps_mode(self):
+        os.chmod(self.FILE, 0o644)
+        subject = adapter.ListFile(self.FILE)
+        subject['2.2.2.2'] = 'new_test'
+        subject.flush()
+        self.assertEqual(os.stat(self.FILE).st_mode & 0o777, 0o644)
+
+    @mock.patch.object(adapter.ListFile, 'BLOCK_LINES', 4)
+    def test_fetch_reuses_unchanged_blocks(self):
+        """
+        Only the blocks whose content changed are parsed again,
+        even after a line is inserted at the top.
+        """
+        lines = ['1.1.%d.%d a_test\n' % (i // 256, i % 256) for i in range(100)]
+        with open(self.FILE, 'w') as f:
+            f.writelines(lines)
+        subject = adapter.ListFile(self.FILE)
+        self.assertGreater(len(subject.blocks), 10)
+        with open(self.FILE, 'w') as f:
+            f.writelines(['2.2.2.2 b_test\n'] + lines)
+        with mock.patch('adapter.list_file.parse_lines',
+                        wraps=adapter.list_file.parse_lines) as parse_lines:
+            subject.fetch()
+        parse_lines.assert_called_once()
+        self.assertTrue(parse_lines.call_args[0][0].startswith(b'2.2.2.2 b_test\n'))
+        self.assertEqual(len(subject), 101)
+        self.assertEqual(subject['2.2.2.2'], 'b_test')
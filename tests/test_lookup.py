@@ -0,0 +1,131 @@
+# coding=utf-8
+import os
+import socket
+import unittest
+from unittest import mock
+import adapter
+import lookup
+
+
+class BaseDict(adapter.Base, dict):
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.notify(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.notify(key, None)
+
+
+class Index(unittest.TestCase):
+    """
+    Test the lookup index.
+    """
+
+    def setUp(self):
+        self.map = BaseDict()
+        self.map['1.2.3.4'] = 'a_test'
+        self.map['10.0.0.0/8'] = 'b_test'
+        self.map['10.1.0.0/16'] = 'c_test'
+        self.map['2001:db8::/32'] = 'a_test'
+        self.map['not-an-address'] = 'a_test'
+        self.index = lookup.Index()
+        self.index.add_map('m', self.map)
+
+    def test_lookup(self):
+        self.assertListEqual(self.index.lookup('1.2.3.4'), ['a_test'])
+        self.assertListEqual(self.index.lookup('1.2.3.5'), [])
+        self.assertListEqual(self.index.lookup('10.1.2.3'), ['b_test', 'c_test'])
+        self.assertListEqual(self.index.lookup('10.2.0.0/16'), ['b_test'])
+        self.assertListEqual(self.index.lookup('10.0.0.0/7'), [])
+        self.assertListEqual(self.index.lookup('2001:db8::1'), ['a_test'])
+        with self.assertRaises(ValueError):
+            self.index.lookup('x')
+
+    def test_updates(self):
+        del self.map['10.0.0.0/8']
+        self.map['1.2.3.4'] = 'd_test'
+        self.assertListEqual(self.index.lookup('10.1.2.3'), ['c_test'])
+        self.assertListEqual(self.index.lookup('1.2.3.4'), ['d_test'])
+        del self.map['10.1.0.0/16']
+        # Only 1.2.3.4 is left.
+        prefixes = self.index.prefixes['m']
+        self.assertListEqual(prefixes.lengths[32], [32])
+        self.assertDictEqual(prefixes.tables[32], {32: {0x01020304: ('1.2.3.4', 'd_test')}})
+
+    def test_reload(self):
+        dict.clear(self.map)
+        dict.__setitem__(self.map, '5.5.5.5', 'e_test')
+        self.map.notify(None, None)
+        self.index.reloads.join()
+        self.assertListEqual(self.index.lookup('1.2.3.4'), [])
+        self.assertListEqual(self.index.lookup('5.5.5.5'), ['e_test'])
+
+    def test_same_prefix_spelled_twice(self):
+        self.map['2001:0db8::/32'] = 'b_test'
+        del self.map['2001:db8::/32']
+        self.assertListEqual(self.index.lookup('2001:db8::1'), ['b_test'])
+
+    def test_server(self):
+        path = '/tmp/disy-test.sock'
+        server = lookup.Server(path, self.index)
+        self.addCleanup(os.unlink, path)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        server.start()
+        with socket.socket(socket.AF_UNIX) as s:
+            s.connect(path)
+            f = s.makefile('rwb')
+            f.write(b'1.2.3.4 10.1.0.0/24 x\n')
+            f.flush()
+            lines = [f.readline() for _ in range(4)]
+        self.assertListEqual(lines, [b'1.2.3.4 a_test\n',
+                                     b'10.1.0.0/24 b_test c_test\n',
+                                     b"x !error not an address or prefix: 'x'\n",
+                                     b'\n'])
+
+
+@mock.patch('threading.Thread', mock.MagicMock())
+class Observed(unittest.TestCase):
+    """
+    Test that adapters notify their changes.
+    """
+
+    def test_address_list(self):
+        subject = adapter.AddressList(mock.MagicMock())
+        callback = mock.Mock()
+        subject.observe(callback)
+        subject.enter_fetch_mode()
+        subject.handle_sentence({'!re': '', '.tag': 'FETCH', '.id': '*1', 'address': '1.1.1.1', 'list': 'a_test'})
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        callback.assert_called_once_with(None, None)
+        subject.handle_sentence({'!re': '', '.tag': 'LISTEN', '.id': '*2', 'address': '2.2.2.2', 'list': 'a_test'})
+        subject['1.1.1.1'] = 'b_test'
+        subject.handle_sentence({'!re': '', '.tag': 'LISTEN', '.id': '*2', '.dead': 'true'})
+        self.assertListEqual(callback.call_args_list[1:], [
+            mock.call('2.2.2.2', 'a_test'),
+            mock.call('1.1.1.1', 'b_test'),
+            mock.call('2.2.2.2', None),
+        ])
+
+    def test_list_file(self):
+        path = '/tmp/disy-test.txt'
+        self.addCleanup(os.unlink, path)
+        with open(path, 'w') as f:
+            f.write('1.1.1.1 a_test\n2.2.2.2 a_test\n')
+        subject = adapter.ListFile(path)
+        callback = mock.Mock()
+        subject.observe(callback)
+        with open(path, 'w') as f:
+            f.write('1.1.1.1 b_test\n3.3.3.3 a_test\n')
+        subject.fetch()
+        self.assertCountEqual(callback.call_args_list, [
+            mock.call('1.1.1.1', 'b_test'),
+            mock.call('2.2.2.2', None),
+            mock.call('3.3.3.3', 'a_test'),
+        ])
+        callback.reset_mock()
+        subject['4.4.4.4'] = 'a_test'
+        subject.flush()
+        callback.assert_called_once_with('4.4.4.4', 'a_test')
@@ -0,0 +1,95 @@
+# coding=utf-8
+import unittest
+from unittest import mock
+import tikapy.api
+import routeros
+
+
+class Encoding(unittest.TestCase):
+    """
+    Test the encoding of API sentences.
+    """
+
+    def test_same_as_tikapy(self):
+        sock = mock.MagicMock()
+        api = tikapy.api.ApiRos(sock)
+        for length in (0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000):
+            sock.reset_mock()
+            word = 'x' * length
+            api.write_word(word)
+            expected = b''.join(c[1][0] for c in sock.sendall.mock_calls)
+            self.assertEqual(routeros.encode_word(word), expected, length)
+
+    def test_sentence(self):
+        self.assertEqual(routeros.encode_sentence(['/ip', '.tag=1']), b'\x03/ip\x06.tag=1\x00')
+
+
+@mock.patch('threading.Thread', mock.MagicMock())
+class Cork(unittest.TestCase):
+    """
+    Test batching of written sentences.
+    """
+
+    def setUp(self):
+        self.client = routeros.Client(('host', 8728), 'user', 'password', cork_size=30, cork_delay=60)
+        self.client.connection = mock.MagicMock()
+        self.sendall = self.client.connection._api.sock.sendall
+
+    def send(self):
+        self.client.send_writes(*self.client.take_writes())
+
+    def test_size(self):
+        self.client.write_sentence(['/a', '.tag=0'])
+        self.client.write_sentence(['/b', '.tag=1'])
+        self.assertFalse(self.client.flush_requested)
+        self.client.write_sentence(['/c', '.tag=2'])
+        self.assertTrue(self.client.flush_requested)
+        self.send()
+        self.sendall.assert_called_once_with(b'\x02/a\x06.tag=0\x00\x02/b\x06.tag=1\x00\x02/c\x06.tag=2\x00')
+
+    def test_flush(self):
+        self.client.write_sentence(['/a'])
+        self.client.flush_writes()
+        self.send()
+        self.sendall.assert_called_once_with(b'\x02/a\x00')
+        self.client.write_sentence(['/b'], flush=True)
+        self.send()
+        self.sendall.assert_called_with(b'\x02/b\x00')
+
+    def test_delay(self):
+        self.client.cork_delay = 0
+        self.client.write_sentence(['/c'])
+        self.send()
+        self.sendall.assert_called_once_with(b'\x02/c\x00')
+
+    def test_write_never_sends(self):
+        """
+        Only the writer thread sends, so a full socket cannot block the reading thread.
+        """
+        self.client.write_sentence(['/a' * 20], flush=True)
+        self.client.flush_writes()
+        self.sendall.assert_not_called()
+
+    def test_reconnected(self):
+        self.client.write_sentence(['/a'], flush=True)
+        self.client.connection = mock.MagicMock()
+        self.send()
+        self.sendall.assert_not_called()
+        self.client.connection._api.sock.sendall.assert_not_called()
+
+    def test_reconnected_before_send(self):
+        self.client.write_sentence(['/a'])
+        self.client.connection = mock.MagicMock()
+        self.client.write_sentence(['/b'], flush=True)
+        self.send()
+        self.client.connection._api.sock.sendall.assert_called_once_with(b'\x02/b\x00')
+
+    def test_writer_woken_once_per_batch(self):
+        with mock.patch.object(self.client.cork, 'notify') as notify:
+            self.client.write_sentence(['/a'])
+            self.client.write_sentence(['/b'])
+            self.assertEqual(notify.call_count, 1)
+            self.client.write_sentence(['/c'], flush=True)
+            self.client.write_sentence(['/d'], flush=True)
+            self.client.flush_writes()
+            self.assertEqual(notify.call_count, 2)
@@ -1,8 +1,12 @@
 # coding=utf-8
 import adapter
+import threading
+import time
 import unittest
 from unittest import mock
 
+Thread = threading.Thread  # not patched
+
 
 @mock.patch('threading.Thread', mock.MagicMock())
 class AddressListDict(unittest.TestCase):
@@ -86,3 +90,277 @@ class AddressListDict(unittest.TestCase):
         subject.handle_sentence(fetch_done)
         self.assertIsNone(subject.removed_ids)
         self.assertListEqual(list(subject.values()), ['list_name_1_test'])
+
+    def test_audit_reconciles_list(self):
+        """
+        An audit replaces the local copy of a list when it differs from RouterOS.
+        """
+        routeros = mock.MagicMock()
+        subject = adapter.AddressList(routeros)
+        subject.enter_fetch_mode()
+        subject.handle_sentence({'!re': '', '.tag': 'FETCH', '.id': '*1', 'address': '1.1.1.1', 'list': 'a_test'})
+        subject.handle_sentence({'!re': '', '.tag': 'FETCH', '.id': '*2', 'address': '2.2.2.2', 'list': 'a_test'})
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        subject.update_event.clear()
+
+        def respond(cmd, flush=False):
+            tag = cmd[1][len('.tag='):]
+            self.assertEqual(cmd[-1], '?list=a_test')
+            subject.handle_sentence({'!re': '', '.tag': tag, '.id': '*2', 'address': '2.2.2.2', 'list': 'a_test'})
+            subject.handle_sentence({'!re': '', '.tag': tag, '.id': '*3', 'address': '3.3.3.3', 'list': 'a_test'})
+            subject.handle_sentence({'!done': '', '.tag': tag})
+
+        routeros.write_sentence.side_effect = respond
+        self.assertListEqual(subject.audit_buckets(), ['a_test'])
+        self.assertTrue(subject.audit('a_test'))
+        self.assertDictEqual(subject.snapshot(), {'2.2.2.2': 'a_test', '3.3.3.3': 'a_test'})
+        self.assertSetEqual(set(subject.by_id), {'*2', '*3'})
+        self.assertTrue(subject.update_event.is_set())
+        self.assertFalse(subject.audit('a_test'))
+        self.assertDictEqual(subject.audits, {})
+
+    def fetched(self, *items):
+        """
+        Return an AddressList holding 'items', (id, address, list) tuples, as fetched from RouterOS.
+        """
+        routeros = mock.MagicMock()
+        subject = adapter.AddressList(routeros)
+        subject.enter_fetch_mode()
+        for _id_, address, list_name in items:
+            subject.handle_sentence({'!re': '', '.tag': 'FETCH', '.id': _id_, 'address': address, 'list': list_name})
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        self.written = routeros.write_sentence
+        return subject
+
+    def test_local_changes_visible_before_ack(self):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['2.2.2.2'] = 'b_test'
+        subject['1.1.1.1'] = 'c_test'
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'c_test', '2.2.2.2': 'b_test'})
+        del subject['1.1.1.1']
+        self.assertNotIn('1.1.1.1', subject)
+        self.assertDictEqual(subject.pending, {'1.1.1.1': 'c_test', '2.2.2.2': 'b_test'})
+
+    def test_add_then_remove_coalesced(self):
+        """
+        An address removed while being added is removed once the add completes.
+        """
+        subject = self.fetched()
+        subject['2.2.2.2'] = 'b_test'
+        subject['2.2.2.2'] = 'c_test'
+        del subject['2.2.2.2']
+        self.assertEqual(self.written.call_count, 1)
+        subject.handle_sentence({'!done': '', '.tag': '0.0', 'ret': '*9'})
+        self.assertEqual(self.written.call_count, 2)
+        self.assertListEqual(self.written.call_args[0][0], ['/ip/firewall/address-list/remove', '.tag=0.1', '=.id=*9'])
+        self.assertDictEqual(subject.pending, {'2.2.2.2': None})
+        subject.handle_sentence({'!done': '', '.tag': '0.1'})
+        self.assertDictEqual(subject.pending, {})
+        self.assertDictEqual(subject.removing, {})
+        self.assertDictEqual(subject.by_id, {})
+        self.assertDictEqual(subject.snapshot(), {})
+
+    def test_sets_coalesced(self):
+        """
+        Only the last of several changes made while a command is pending is sent.
+        """
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['1.1.1.1'] = 'b_test'
+        subject['1.1.1.1'] = 'c_test'
+        subject['1.1.1.1'] = 'd_test'
+        # The /listen echo of the first set must not undo the later changes.
+        subject.handle_sentence({'!re': '', '.tag': 'LISTEN', '.id': '*1', 'address': '1.1.1.1', 'list': 'b_test'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        self.assertEqual(self.written.call_count, 2)
+        self.assertListEqual(self.written.call_args[0][0], ['/ip/firewall/address-list/set', '.tag=0.1', '=.id=*1', '=list=d_test'])
+        subject.handle_sentence({'!done': '', '.tag': '0.1'})
+        self.assertDictEqual(subject.pending, {})
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'd_test'})
+
+    def test_remove_then_add(self):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        del subject['1.1.1.1']
+        subject['1.1.1.1'] = 'b_test'
+        subject.handle_sentence({'!re': '', '.tag': 'LISTEN', '.id': '*1', '.dead': 'true'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        self.assertListEqual(self.written.call_args[0][0], ['/ip/firewall/address-list/add', '.tag=0.1',
+                                                            '=address=1.1.1.1', '=list=b_test'])
+        subject.handle_sentence({'!done': '', '.tag': '0.1', 'ret': '*2'})
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'b_test'})
+        self.assertListEqual(list(subject.by_id), ['*2'])
+
+    @mock.patch('threading.Timer')
+    def test_trap_retried(self, timer):
+        """
+        A failed command is retried later; changes made meanwhile are coalesced.
+        """
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['1.1.1.1'] = 'b_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        self.assertEqual(timer.call_args[0][0], 1)
+        self.assertDictEqual(subject.pending, {'1.1.1.1': 'b_test'})
+        subject['1.1.1.1'] = 'c_test'
+        self.assertEqual(self.written.call_count, 1)
+        subject.retry(*timer.call_args[0][2])
+        self.assertListEqual(self.written.call_args[0][0], ['/ip/firewall/address-list/set', '.tag=0.1', '=.id=*1', '=list=c_test'])
+        subject.handle_sentence({'!trap': '', '.tag': '0.1', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.1'})
+        self.assertEqual(timer.call_args[0][0], 2)
+        subject.retry(*timer.call_args[0][2])
+        subject.handle_sentence({'!done': '', '.tag': '0.2'})
+        self.assertDictEqual(subject.pending, {})
+        self.assertDictEqual(subject.retrying, {})
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'c_test'})
+
+    @mock.patch('threading.Timer')
+    def test_trap_given_up(self, timer):
+        """
+        After 'retries' attempts, a failed add is dropped from the local copy.
+        """
+        subject = self.fetched()
+        subject.retries = 1
+        subject['2.2.2.2'] = 'b_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        subject.retry(*timer.call_args[0][2])
+        subject.handle_sentence({'!trap': '', '.tag': '0.1', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.1'})
+        self.assertEqual(timer.call_count, 1)
+        self.assertDictEqual(subject.snapshot(), {})
+        self.assertDictEqual(subject.pending, {})
+        self.assertDictEqual(subject.failed, {'2.2.2.2': ('b_test', 'failure')})
+        subject.flush()
+
+    @mock.patch('threading.Timer')
+    def test_set_given_up_restores_list(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject.retries = 0
+        subject['1.1.1.1'] = 'b_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'a_test'})
+        self.assertDictEqual(subject.failures(), {'1.1.1.1': ('b_test', 'failure')})
+        subject['1.1.1.1'] = 'b_test'
+        self.assertListEqual(self.written.call_args[0][0], ['/ip/firewall/address-list/set', '.tag=0.1',
+                                                            '=.id=*1', '=list=b_test'])
+
+    @mock.patch('threading.Timer')
+    def test_permanent_trap_not_retried(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['2.2.2.2'] = 'b_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure: already have such entry'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        timer.assert_not_called()
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'a_test'})
+        self.assertDictEqual(subject.failures(), {'2.2.2.2': ('b_test', 'failure: already have such entry')})
+        subject.flush()
+
+    @mock.patch('threading.Timer')
+    def test_remove_missing_item(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        del subject['1.1.1.1']
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'no such item'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        timer.assert_not_called()
+        self.assertDictEqual(subject.snapshot(), {})
+        self.assertDictEqual(subject.failures(), {})
+        self.assertDictEqual(subject.by_id, {})
+
+    @mock.patch('threading.Timer')
+    def test_retry_cancelled_by_fetch(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        del subject['1.1.1.1']
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+        subject.enter_fetch_mode()
+        timer.return_value.cancel.assert_called_once_with()
+        subject.retry(*timer.call_args[0][2])
+        self.assertEqual(self.written.call_count, 1)
+        self.assertDictEqual(subject.retrying, {})
+
+    def test_refetch_releases_flush(self):
+        """
+        A reconnection while 'dest' is being updated must not wait for commands
+        that only the reading thread, blocked on the adapter lock, could complete.
+        """
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        with subject:
+            subject['1.1.1.1'] = 'b_test'
+            reader = Thread(target=subject.enter_fetch_mode)
+            reader.start()
+            while not subject.refetching:
+                time.sleep(0.01)
+            subject['2.2.2.2'] = 'c_test'
+            self.assertDictEqual(subject.commands, {})
+            subject.flush()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(self.written.call_count, 1)
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        self.assertFalse(subject.refetching)
+
+    @mock.patch('threading.Timer')
+    def test_audit_while_retrying(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['2.2.2.2'] = 'a_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'failure'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+
+        def respond(cmd, flush=False):
+            tag = cmd[1][len('.tag='):]
+            subject.handle_sentence({'!re': '', '.tag': tag, '.id': '*1', 'address': '1.1.1.1', 'list': 'a_test'})
+            subject.handle_sentence({'!done': '', '.tag': tag})
+
+        self.written.side_effect = respond
+        self.assertFalse(subject.audit('a_test', timeout=1))
+        self.assertDictEqual(subject.audits, {})
+        self.assertDictEqual(subject.snapshot(), {'1.1.1.1': 'a_test', '2.2.2.2': 'a_test'})
+
+    @mock.patch('threading.Timer')
+    def test_refetch_releases_flush_while_retrying(self, timer):
+        subject = self.fetched(('*1', '1.1.1.1', 'a_test'))
+        subject['1.1.1.1'] = 'b_test'
+        subject.handle_sentence({'!trap': '', '.tag': '0.0', 'message': 'timeout'})
+        subject.handle_sentence({'!done': '', '.tag': '0.0'})
+
+        def synchronize():
+            with subject:
+                subject.flush()
+
+        synchronizer = Thread(target=synchronize)
+        synchronizer.start()
+        while not subject.lock.locked():
+            time.sleep(0.01)
+        subject.enter_fetch_mode()
+        synchronizer.join(5)
+        self.assertFalse(synchronizer.is_alive())
+        timer.return_value.cancel.assert_called_once_with()
+        self.assertDictEqual(subject.retrying, {})
+        subject.retry(*timer.call_args[0][2])
+        self.assertEqual(self.written.call_count, 1)
+
+    def test_flush_timeout(self):
+        subject = self.fetched()
+        subject['1.1.1.1'] = 'a_test'
+        self.assertFalse(subject.flush(timeout=0))
+        subject.handle_sentence({'!done': '', '.tag': '0.0', 'ret': '*1'})
+        self.assertTrue(subject.flush(timeout=0))
+
+    def test_flush_after_refetch(self):
+        """
+        Changes discarded by a refetch are reported by flush().
+        """
+        subject = self.fetched()
+        subject['1.1.1.1'] = 'a_test'
+        subject.enter_fetch_mode()
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        self.assertFalse(subject.flush(timeout=0))
+        self.assertTrue(subject.flush(timeout=0))
+
+    def test_wait_ready(self):
+        subject = adapter.AddressList(mock.MagicMock())
+        self.assertFalse(subject.wait_ready(0))
+        subject.enter_fetch_mode()
+        subject.handle_sentence({'!done': '', '.tag': 'FETCH'})
+        self.assertTrue(subject.wait_ready(0))
@@ -0,0 +1,69 @@
+# coding=utf-8
+import gzip
+import os
+import shutil
+import unittest
+from unittest import mock
+import adapter
+from adapter.routeros import capture, reader
+
+
+@mock.patch('threading.Thread', mock.MagicMock())
+class Capture(unittest.TestCase):
+    """
+    Test recording and replaying RouterOS sentences.
+    """
+
+    TMP = '/tmp/path'
+    FILE = TMP + '/capture.gz'
+
+    def setUp(self):
+        os.mkdir(self.TMP)
+
+    def tearDown(self):
+        shutil.rmtree(self.TMP)
+
+    def test_record_and_replay(self):
+        sentences = [
+            ['!re', '.tag=FETCH.0', '=.id=*1', '=address=1.2.3.4', '=list=list_name_1_test'],
+            ['!re', '.tag=FETCH.0', '=.id=*2', '=address=2.3.4.5', '=list=list_name_2_test'],
+            ['!done', '.tag=FETCH.0'],
+            ['!done', '.tag=0.0', '=ret=*3'],
+            ['!done', '.tag=0.1'],
+        ]
+        routeros = mock.MagicMock()
+        routeros.connection._api.read_sentence.side_effect = sentences
+        subject = adapter.AddressList(routeros, capture=self.FILE)
+        shared = reader._readers[routeros]
+        shared.write_fetch(['0.'])
+        for _ in range(3):
+            shared.read_sentence()
+        with subject:
+            subject['5.6.7.8'] = 'list_name_3_test'
+            del subject['1.2.3.4']
+        shared.read_sentence()
+        shared.read_sentence()
+        subject.recorder.close()
+        expected = {'2.3.4.5': 'list_name_2_test', '5.6.7.8': 'list_name_3_test'}
+        self.assertDictEqual(subject.snapshot(), expected)
+
+        records = list(capture.read(self.FILE))
+        self.assertListEqual([r[1] for r in records], ['w', 'r', 'r', 'r', 'w', 'w', 'r', 'r'])
+        self.assertListEqual(records[1][2], sentences[0])
+
+        replayed = adapter.AddressList()
+        self.assertEqual(capture.replay(self.FILE, replayed), 5)
+        self.assertDictEqual(replayed.snapshot(), expected)
+        self.assertDictEqual(replayed.commands, {})
+
+    def test_read_truncated(self):
+        """
+        A capture cut short by a killed process is readable up to its last flush.
+        """
+        recorder = capture.Recorder(self.FILE)
+        recorder.record('r', ['!done', '.tag=0.0'])
+        recorder.flush()
+        with open(self.FILE, 'ab') as f:
+            f.write(gzip.compress(b'1.0 r ["!done",".tag=0.1"]\n')[:20])
+        records = list(capture.read(self.FILE))
+        self.assertListEqual([r[2] for r in records], [['!done', '.tag=0.0']])
@@ -0,0 +1,77 @@
+# coding=utf-8
+import unittest
+from unittest import mock
+import adapter
+from adapter.routeros import reader
+
+
+class SharedReader(unittest.TestCase):
+    """
+    Test one reader shared by the address lists of a RouterOS client.
+    """
+
+    def setUp(self):
+        patcher = mock.patch('threading.Thread', mock.MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.routeros = mock.MagicMock()
+        self.a = adapter.AddressList(self.routeros, pattern=r'a_.*')
+        self.b = adapter.AddressList(self.routeros, pattern=r'b_.*')
+        self.reader = reader._readers[self.routeros]
+
+    def written(self):
+        return [c[1][0] for c in self.routeros.write_sentence.mock_calls]
+
+    def test_one_reader_per_client(self):
+        self.assertEqual(self.a.tag_prefix, '0.')
+        self.assertEqual(self.b.tag_prefix, '1.')
+        self.assertIs(self.reader.subjects['1.'], self.b)
+
+    def test_fetch_dispatched_by_list(self):
+        self.reader.write_fetch(['0.', '1.'])
+        self.assertEqual(len(self.written()), 1)
+        self.reader.dispatch(['!re', '.tag=FETCH.0', '=.id=*1', '=address=1.1.1.1', '=list=a_test'])
+        self.reader.dispatch(['!re', '.tag=FETCH.0', '=.id=*2', '=address=2.2.2.2', '=list=b_test'])
+        self.reader.dispatch(['!re', '.tag=FETCH.0', '=.id=*3', '=address=3.3.3.3', '=list=c_test'])
+        self.reader.dispatch(['!done', '.tag=FETCH.0'])
+        self.assertDictEqual(self.a.snapshot(), {'1.1.1.1': 'a_test'})
+        self.assertDictEqual(self.b.snapshot(), {'2.2.2.2': 'b_test'})
+        self.assertFalse(self.a.in_fetch_mode())
+        self.assertFalse(self.b.in_fetch_mode())
+
+    def test_listen(self):
+        self.reader.write_fetch(['0.', '1.'])
+        self.reader.dispatch(['!done', '.tag=FETCH.0'])
+        self.reader.dispatch(['!re', '.tag=LISTEN', '=.id=*1', '=address=1.1.1.1', '=list=a_test'])
+        self.assertDictEqual(self.a.snapshot(), {'1.1.1.1': 'a_test'})
+        self.assertDictEqual(self.b.snapshot(), {})
+        # Moved to a list of the other address list.
+        self.reader.dispatch(['!re', '.tag=LISTEN', '=.id=*1', '=address=1.1.1.1', '=list=b_test'])
+        self.assertDictEqual(self.a.snapshot(), {})
+        self.assertDictEqual(self.b.snapshot(), {'1.1.1.1': 'b_test'})
+        self.reader.dispatch(['!re', '.tag=LISTEN', '=.id=*1', '=.dead=true'])
+        self.assertDictEqual(self.b.snapshot(), {})
+
+    def test_command_response(self):
+        self.reader.write_fetch(['0.', '1.'])
+        self.reader.dispatch(['!done', '.tag=FETCH.0'])
+        with self.b:
+            self.b['2.2.2.2'] = 'b_test'
+        self.assertListEqual(list(self.b.commands), ['1.0'])
+        self.reader.dispatch(['!done', '.tag=1.0', '=ret=*9'])
+        self.assertDictEqual(self.b.commands, {})
+        self.assertDictEqual(self.b.snapshot(), {'2.2.2.2': 'b_test'})
+        self.assertDictEqual(self.a.snapshot(), {})
+
+    def test_register_while_connected(self):
+        self.reader.write_fetch(['0.', '1.'])
+        self.reader.dispatch(['!done', '.tag=FETCH.0'])
+        self.reader.connected = True
+        c = adapter.AddressList(self.routeros, pattern=r'a_.*')
+        self.assertTrue(c.in_fetch_mode())
+        self.assertFalse(self.a.in_fetch_mode())
+        self.assertEqual(self.written()[-1][-1], '.tag=FETCH.1')
+        self.reader.dispatch(['!re', '.tag=FETCH.1', '=.id=*1', '=address=1.1.1.1', '=list=a_test'])
+        self.reader.dispatch(['!done', '.tag=FETCH.1'])
+        self.assertDictEqual(c.snapshot(), {'1.1.1.1': 'a_test'})
+        self.assertDictEqual(self.a.snapshot(), {})
@@ -14,6 +14,10 @@ class BaseOrderedDict(adapter.Base, collections.OrderedDict):
     pass
 
 
+class BaseThreadedDict(adapter.base.ThreadedBase, dict):
+    pass
+
+
 def wrap_dict(obj):
     mock_obj = mock.MagicMock(wraps=obj)
     mock_obj.__getitem__.side_effect = obj.__getitem__
@@ -29,17 +33,17 @@ class DictSynchronization(unittest.TestCase):
     """
 
     def test_add_1(self):
-        s, d = BaseDict({'1.2.3.4': 'a_test'}), wrap_dict({})
+        s, d = BaseDict({'1.2.3.4': 'a_test'}), wrap_dict(BaseDict({}))
         sync.Synchronizer(s, d).synchronize()
         d.__setitem__.assert_called_once_with('1.2.3.4', 'a_test')
 
     def test_remove_1(self):
-        s, d = BaseDict({}), wrap_dict({'1.2.3.4': 'a_test'})
+        s, d = BaseDict({}), wrap_dict(BaseDict({'1.2.3.4': 'a_test'}))
         sync.Synchronizer(s, d).synchronize()
         d.__delitem__.assert_called_once_with('1.2.3.4')
 
     def test_set_1(self):
-        s, d = BaseDict({'1.2.3.4': 'a_test'}), wrap_dict({'1.2.3.4': 'b_test'})
+        s, d = BaseDict({'1.2.3.4': 'a_test'}), wrap_dict(BaseDict({'1.2.3.4': 'b_test'}))
         sync.Synchronizer(s, d).synchronize()
         d.__setitem__.assert_called_once_with('1.2.3.4', 'a_test')
 
@@ -50,10 +54,83 @@ class DictSynchronization(unittest.TestCase):
         sync.Synchronizer(local, remote_mock).synchronize()
         remote_mock.assert_has_calls([
             ('__setitem__', ('1.2.3.4', 'a_test')),
-            mock.ANY,
             ('__setitem__', ('9.9.9.9', 'new')),
-            mock.ANY,
             ('__delitem__', ('5.4.3.2',)),
         ])
         result = collections.OrderedDict([('9.9.9.9', 'new'), ('1.2.3.4', 'a_test')])
         self.assertDictEqual(result, remote)
+
+    def test_source_unlocked_during_flush(self):
+        """
+        The source lock must not be held while waiting for 'dest' to flush.
+        """
+        source = BaseThreadedDict()
+        source['1.2.3.4'] = 'a_test'
+        d = wrap_dict(BaseDict({}))
+        d.flush.side_effect = lambda wait: self.assertFalse(source.lock.locked())
+        sync.Synchronizer(source, d).synchronize()
+        d.flush.assert_called_once_with(wait=True)
+        d.__setitem__.assert_called_once_with('1.2.3.4', 'a_test')
+
+    def test_locks_not_nested(self):
+        """
+        The dest lock must not be taken while the source lock is held.
+        """
+        source = BaseThreadedDict()
+        source['1.2.3.4'] = 'a_test'
+        d = wrap_dict(BaseDict({}))
+        d.__enter__.side_effect = lambda: self.assertFalse(source.lock.locked())
+        sync.Synchronizer(source, d).synchronize()
+        d.__enter__.assert_called_once_with()
+        d.__setitem__.assert_called_once_with('1.2.3.4', 'a_test')
+
+    def test_priority_order(self):
+        """
+        New keys are applied first, then list changes, then removals.
+        Within each kind, lists with lower priorities go first.
+        """
+        remote = BaseOrderedDict([('1.1.1.1', 'a_test'), ('2.2.2.2', 'a_test'), ('3.3.3.3', 'b_test')])
+        local = BaseOrderedDict([('2.2.2.2', 'b_test'), ('4.4.4.4', 'a_test'), ('5.5.5.5', 'b_test')])
+        remote_mock = wrap_dict(remote)
+        remote_mock.__contains__.side_effect = remote.__contains__
+        sync.Synchronizer(local, remote_mock, {'b_test': -1}).synchronize()
+        calls = [c for c in remote_mock.mock_calls if c[0] in ('__setitem__', '__delitem__')]
+        self.assertListEqual(calls, [
+            ('__setitem__', ('5.5.5.5', 'b_test')),
+            ('__setitem__', ('4.4.4.4', 'a_test')),
+            ('__setitem__', ('2.2.2.2', 'b_test')),
+            ('__delitem__', ('3.3.3.3',)),
+            ('__delitem__', ('1.1.1.1',)),
+        ])
+
+    def test_pipeline_does_not_wait(self):
+        s, d = BaseDict({'1.2.3.4': 'a_test'}), wrap_dict(BaseDict({}))
+        sync.Synchronizer(s, d, pipeline=True).synchronize()
+        d.flush.assert_called_once_with(wait=False)
+
+    def test_skips_failed(self):
+        s = BaseDict({'1.1.1.1': 'a_test', '2.2.2.2': 'b_test'})
+        d = wrap_dict(BaseDict({}))
+        d.failures = mock.Mock(return_value={'1.1.1.1': ('a_test', 'failure'), '2.2.2.2': ('c_test', 'failure')})
+        self.assertListEqual(sync.Synchronizer(s, d).synchronize(), [1, 0, 0])
+        d.__setitem__.assert_called_once_with('2.2.2.2', 'b_test')
+
+    def test_once(self):
+        s = BaseDict({'1.1.1.1': 'a_test', '2.2.2.2': 'a_test', '3.3.3.3': 'b_test'})
+        d = BaseDict({'2.2.2.2': 'b_test', '4.4.4.4': 'a_test'})
+        self.assertListEqual(sync.Synchronizer(s, d).once(), [2, 1, 1])
+        self.assertDictEqual(d, s)
+
+    def test_once_not_applied(self):
+        s, d = BaseDict({'1.1.1.1': 'a_test'}), BaseDict()
+        d.flush = mock.Mock(return_value=False)
+        with self.assertRaises(RuntimeError):
+            sync.Synchronizer(s, d).once(0)
+        d.flush.assert_called_with(timeout=0)
+
+    def test_once_not_ready(self):
+        s, d = BaseDict({'1.1.1.1': 'a_test'}), BaseDict()
+        d.wait_ready = mock.Mock(return_value=False)
+        with self.assertRaises(TimeoutError):
+            sync.Synchronizer(s, d).once(0)
+        self.assertDictEqual(d, {})